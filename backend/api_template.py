@@ -5,33 +5,70 @@ My Personal Bloomberg - 后端 API 模板
 这是给下一位开发者的后端 API 模板。
 部署到 Vercel 后，Android App 可以连接获取真实数据。
 
-使用方法：
-1. pip install fastapi uvicorn finnhub-python yfinance google-genai requests
+使用方法（在仓库根目录执行，与 push_telegram.py 共用的模块都在根目录）：
+1. pip install -r backend/requirements.txt
 2. 设置环境变量（FINNHUB_KEY, GEMINI_KEY, FRED_KEY）
-3. uvicorn main:app --reload
+3. uvicorn backend.api_template:app --reload
 4. 访问 http://localhost:8000/docs 查看 API 文档
 
-部署到 Vercel：
-1. 创建 vercel.json 配置文件
-2. vercel --prod
+部署到 Vercel（在仓库根目录执行）：
+1. 根目录的 vercel.json 以本文件为入口，并通过 includeFiles 打包根目录的共享模块
+2. vercel.json 设置了 NEWS_REFRESH=0：没有常驻的后台刷新，/api/news 在请求时按需刷新
+   （实例冷启动后的第一次请求要等一轮完整的取数和 AI 分析）
+3. vercel --prod
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import functools
+from collections import deque
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import finnhub
 import yfinance as yf
 from datetime import datetime
 import pytz
 
+# 与 push_telegram.py 共用的模块位于仓库根目录（从根目录启动，部署时由 vercel.json 一并打包）
+from local_cache import fundamentals_cache, analysis_cache
+import ratelimit
+import http_pool
+import metrics
+import feeds
+from response_cache import response_cache
+from payload import Payload
+from price_store import price_store
+import quote_stream
+from quote_stream import QuoteHub, HubFull
+
 # ============== 初始化 ==============
 
+@asynccontextmanager
+async def lifespan(app):
+    """启动时拉起新闻后台刷新（NEWS_REFRESH=0 关闭，如 Vercel 这类无常驻进程的部署，改为请求时按需刷新）"""
+    task = None
+    if NEWS_BACKGROUND_REFRESH:
+        task = asyncio.create_task(news_refresher.run_forever())
+    yield
+    if task:
+        task.cancel()
+
+
 app = FastAPI(
     title="My Personal Bloomberg API",
     description="金融数据和AI分析API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 允许跨域（Android App 需要）
@@ -43,13 +80,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """每个端点的延迟直方图（按路由模板聚合，/api/stock/{ticker} 不按 ticker 拆开）"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        metrics.observe("http_request_seconds", time.perf_counter() - start,
+                        route=path, method=request.method, status=status)
+
+
 # API Keys（从环境变量读取）
 FINNHUB_KEY = os.getenv("FINNHUB_KEY", "")
 GEMINI_KEY = os.getenv("GEMINI_KEY", "")
 FRED_KEY = os.getenv("FRED_KEY", "")
 
+# 阻塞的上游调用（finnhub / yfinance / SQLite 缓存 / Gemini）统一放进有界线程池，
+# 不占用事件循环；池大小限制了同时在途的上游请求数
+BACKEND_WORKERS = int(os.getenv("BACKEND_WORKERS", "16"))
+_executor = ThreadPoolExecutor(max_workers=BACKEND_WORKERS, thread_name_prefix="upstream")
+# SSE 推送的轮询用独立的小线程池，订阅再多也不挤占 REST 请求的上游配额
+STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", "4"))
+_stream_executor = ThreadPoolExecutor(max_workers=STREAM_WORKERS, thread_name_prefix="stream")
+
+
+async def run_blocking(fn, *args, executor=None):
+    """在有界线程池（默认 _executor）中执行阻塞函数"""
+    return await asyncio.get_running_loop().run_in_executor(executor or _executor, functools.partial(fn, *args))
+
+
+# 响应缓存：路由 → (新鲜期, 过期后仍可先返回旧值并后台刷新的时长)，单位秒
+CACHE_TTLS = {
+    "market-overview": (float(os.getenv("MARKET_CACHE_TTL", "5")), float(os.getenv("MARKET_CACHE_STALE", "60"))),
+    "stock": (float(os.getenv("STOCK_CACHE_TTL", "30")), float(os.getenv("STOCK_CACHE_STALE", "300"))),
+}
+
+
+async def cached(route, key, fetch, cacheable=None):
+    """经响应缓存取 Payload，返回 (payload, 缓存状态 hit / stale / miss)
+    
+    缓存的是转换好的 Payload，命中时连同已生成的 JSON / msgpack / 压缩结果一起复用。
+    """
+    ttl, stale_ttl = CACHE_TTLS[route]
+    
+    async def build():
+        return Payload(jsonable_encoder(await fetch()))
+    
+    return await response_cache().get_or_fetch(
+        key, build, ttl, stale_ttl,
+        cacheable=cacheable and (lambda payload: cacheable(payload.data)),
+    )
+
+
+def send(request: Request, payload: Payload, headers: Optional[dict] = None) -> Response:
+    """按请求头输出 Payload：ETag / If-None-Match → 304、gzip / br 压缩、Accept 协商 msgpack"""
+    status, body, extra = payload.render(
+        request.headers.get("accept"),
+        request.headers.get("accept-encoding"),
+        request.headers.get("if-none-match"),
+    )
+    return Response(body, status_code=status, headers={**extra, **(headers or {})})
+
+
 # Finnhub 客户端
 fh_client = finnhub.Client(api_key=FINNHUB_KEY) if FINNHUB_KEY else None
+if fh_client:
+    http_pool.mount(fh_client._session)  # 复用共享连接池配置
 
 
 # ============== 数据模型 ==============
@@ -152,69 +256,393 @@ def get_analyst_consensus(buy: int, hold: int, sell: int) -> str:
         return "持有"
 
 
-# ============== API 端点 ==============
+_pipeline = None
 
-@app.get("/")
-async def root():
-    return {"message": "My Personal Bloomberg API", "status": "running"}
+# 后端只用到 push_telegram 的取数和分析（不发飞书），只需这两项凭证
+PIPELINE_CONFIG = ["finnhub_key", "gemini_key"]
 
 
-@app.get("/api/market-overview", response_model=MarketOverview)
-async def get_market_overview():
-    """获取市场概览数据"""
+def load_pipeline():
+    """按需导入 push_telegram 作为分析引擎；环境变量不全时返回 None"""
+    global _pipeline
+    if _pipeline is None:
+        try:
+            import push_telegram
+            push_telegram.check_config(PIPELINE_CONFIG)
+            _pipeline = push_telegram
+        except Exception as e:
+            print(f"Pipeline unavailable: {e}")
+            return None
+    return _pipeline
+
+
+def to_ai_analysis(result: dict) -> AIAnalysis:
+    """push_telegram 的分析结果 → API 模型"""
+    score = result["score"]
+    signal = "利好" if score >= 7 else "利空" if score <= 4 else "中性"
+    return AIAnalysis(
+        score=score,
+        signal=signal,
+        coreJudgment=result["core"],
+        causalChain=result["logic"],
+        valuationView=result["valuation"],
+        risk=result["risk"],
+        recommendation=result["action"]
+    )
+
+
+def to_news_card(entry: dict, ticker: str, data: dict, analysis: dict) -> NewsCard:
+    """push_telegram 的一条新闻（取数结果 + AI 分析）→ API 模型"""
+    q = data.get("quote")
+    quote = None
+    if q:
+        quote = StockQuote(
+            ticker=ticker,
+            price=q["price"],
+            change=round(q["price"] - q["prev"], 2),
+            changePercent=round(q["change"], 2),
+            previousClose=q["prev"]
+        )
     
-    indices = []
+    f = data.get("fundamentals") or {}
+    fundamentals = None
+    if f:
+        fundamentals = StockFundamentals(
+            ticker=ticker,
+            companyName=f.get("short_name") or ticker,
+            sector=f.get("sector") or "Unknown",
+            pe=f.get("pe"),
+            forwardPe=f.get("forward_pe"),
+            marketCap=int(f["market_cap"]) if f.get("market_cap") else None,
+            week52High=f.get("week_52_high"),
+            week52Low=f.get("week_52_low"),
+            week52Position=data.get("week_52_position"),
+            beta=f.get("beta"),
+            targetPrice=f.get("target_price"),
+            upside=data.get("upside")
+        )
     
-    # 获取主要指数数据
-    tickers = [
-        ("SPY", "S&P500"),
-        ("QQQ", "纳指100"),
-        ("DIA", "道指")
-    ]
+    a = data.get("analyst")
+    analyst = None
+    if a:
+        analyst = AnalystRating(
+            ticker=ticker,
+            buyCount=a["buy"],
+            holdCount=a["hold"],
+            sellCount=a["sell"],
+            consensus=get_analyst_consensus(a["buy"], a["hold"], a["sell"])
+        )
     
-    for ticker, name in tickers:
-        try:
-            if fh_client:
-                quote = fh_client.quote(ticker)
-                indices.append(MarketIndex(
-                    ticker=ticker,
-                    name=name,
-                    price=quote.get('c', 0),
-                    change=quote.get('d', 0),
-                    changePercent=quote.get('dp', 0)
-                ))
-            else:
-                # 使用 yfinance 作为备选
-                stock = yf.Ticker(ticker)
-                hist = stock.history(period="2d")
-                if len(hist) >= 2:
-                    price = hist['Close'].iloc[-1]
-                    prev = hist['Close'].iloc[-2]
-                    change = price - prev
-                    change_pct = (change / prev) * 100
-                    indices.append(MarketIndex(
-                        ticker=ticker,
-                        name=name,
-                        price=round(price, 2),
-                        change=round(change, 2),
-                        changePercent=round(change_pct, 2)
-                    ))
-        except Exception as e:
-            print(f"Error fetching {ticker}: {e}")
+    return NewsCard(
+        id=hashlib.sha1(feeds.entry_id(entry).encode("utf-8")).hexdigest()[:16],
+        title=entry.get("title", "No Title"),
+        source=entry.get("source", "WSJ"),
+        publishedAt=entry.get("published") or get_est_time(),
+        ticker=ticker,
+        quote=quote,
+        fundamentals=fundamentals,
+        analyst=analyst,
+        analysis=to_ai_analysis(analysis)
+    )
+
+
+# ============== 新闻预计算 ==============
+
+NEWS_REFRESH_SECONDS = float(os.getenv("NEWS_REFRESH_SECONDS", "300"))
+# 1：启动后台定时刷新；0：没有常驻进程（Vercel），/api/news 在库为空或超过刷新间隔时当场刷新一轮
+NEWS_BACKGROUND_REFRESH = os.getenv("NEWS_REFRESH", "1") != "0"
+# 每轮最多分析的新条目数（其余留到下一轮）
+NEWS_REFRESH_LIMIT = int(os.getenv("NEWS_REFRESH_LIMIT", "10"))
+NEWS_STORE_MAX = int(os.getenv("NEWS_STORE_MAX", "200"))
+
+
+class NewsStore:
+    """已生成的新闻卡片（内存）；每张卡片按生成顺序编号，编号即分页游标"""
+    
+    def __init__(self, max_cards=NEWS_STORE_MAX):
+        self._cards = deque(maxlen=max_cards)  # (seq, 卡片 dict)，旧 → 新
+        self._seq = 0
+        self.updated_at = None
+    
+    @property
+    def latest(self) -> int:
+        return self._seq
+    
+    def add(self, cards):
+        """cards 按新 → 旧传入（与 RSS 顺序一致），最新的一条拿到最大的编号
+        
+        入库时转换成 JSON 兼容的 dict，之后每次请求不再重复转换模型。
+        """
+        for card in reversed(cards):
+            self._seq += 1
+            self._cards.append((self._seq, jsonable_encoder(card)))
+        self.updated_at = get_est_time()
+    
+    def page(self, since=None, cursor=None, limit=20):
+        """新 → 旧：since 只取比它新的卡片，cursor 取比它旧的（翻页）；返回 (卡片, 下一页游标)"""
+        matched = [
+            (seq, card) for seq, card in reversed(self._cards)
+            if (since is None or seq > since) and (cursor is None or seq < cursor)
+        ]
+        page = matched[:limit]
+        next_cursor = page[-1][0] if len(matched) > limit else None
+        return page, next_cursor
+
+
+class NewsRefresher:
+    """后台定时跑 push_telegram 的流水线：增量抓取 → 识别标的 → 取数 → AI 分析 → NewsCard"""
+    
+    def __init__(self, store: NewsStore):
+        self.store = store
+        self.state = None
+        self.running = False
+        self.last_error = None
+        self.refreshed_at = None  # 上一轮结束的 time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def refresh_once(self, pipeline) -> List[NewsCard]:
+        """同步执行一轮（在线程池里跑）；已读索引和条件请求头只保存在进程内"""
+        if self.state is None:
+            self.state = feeds.FeedState(":memory:")
+        ingest = feeds.ingest(feeds.load_feeds(), self.state)
+        if ingest.unchanged:
+            return []
+        entries, tickers, skipped = pipeline.select_entries(ingest.entries, NEWS_REFRESH_LIMIT)
+        results = pipeline.collect_analyses(entries, tickers)
+        feeds.commit(self.state, ingest, entries + skipped)
+        return [
+            to_news_card(entry, ticker, data, analysis)
+            for entry, ticker, (data, analysis) in zip(entries, tickers, results)
+        ]
     
-    # 获取 VIX
-    vix_data = None
+    def due(self) -> bool:
+        """从未刷新过，或距上一轮已超过 NEWS_REFRESH_SECONDS"""
+        return self.refreshed_at is None or time.monotonic() - self.refreshed_at >= NEWS_REFRESH_SECONDS
+    
+    async def refresh(self):
+        """跑一轮并写入 store；已有一轮在跑时只等它结束，不重复跑"""
+        if self._lock.locked():
+            async with self._lock:
+                return
+        async with self._lock:
+            pipeline = load_pipeline()
+            if pipeline is None:
+                return
+            self.running = True
+            try:
+                with metrics.span("news_refresh"):
+                    cards = await run_blocking(self.refresh_once, pipeline)
+                self.store.add(cards)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"News refresh error: {e}")
+            finally:
+                self.running = False
+                self.refreshed_at = time.monotonic()
+    
+    async def run_forever(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(NEWS_REFRESH_SECONDS)
+
+
+news_store = NewsStore()
+news_refresher = NewsRefresher(news_store)
+
+
+# ============== 上游取数（同步，跑在有界线程池里） ==============
+
+MARKET_INDICES = [
+    ("SPY", "S&P500"),
+    ("QQQ", "纳指100"),
+    ("DIA", "道指")
+]
+
+
+def finnhub_call(call: str, fn, *args):
+    """Finnhub 请求：不在线程池里等令牌，没有余量时抛 ratelimit.Throttled；只对真正发出的请求计时"""
+    def timed():
+        with metrics.span("upstream", call=call):
+            return fn(*args)
+    return ratelimit.try_call("finnhub", timed)
+
+
+def fetch_index(ticker: str, name: str) -> Optional[MarketIndex]:
+    """单个指数报价：Finnhub 优先，未配置时用 yfinance 两日收盘价"""
+    try:
+        if fh_client:
+            quote = finnhub_call("finnhub.quote", fh_client.quote, ticker)
+            return MarketIndex(
+                ticker=ticker,
+                name=name,
+                price=quote.get('c', 0),
+                change=quote.get('d', 0),
+                changePercent=quote.get('dp', 0)
+            )
+        # 使用 yfinance 作为备选
+        with metrics.span("upstream", call="yfinance.history"):
+            hist = yf.Ticker(ticker).history(period="2d")
+        if len(hist) >= 2:
+            price = hist['Close'].iloc[-1]
+            prev = hist['Close'].iloc[-2]
+            change = price - prev
+            change_pct = (change / prev) * 100
+            return MarketIndex(
+                ticker=ticker,
+                name=name,
+                price=round(price, 2),
+                change=round(change, 2),
+                changePercent=round(change_pct, 2)
+            )
+    except Exception as e:
+        print(f"Error fetching {ticker}: {e}")
+    return None
+
+
+def fetch_vix() -> Optional[VixData]:
     try:
-        vix = yf.Ticker("^VIX")
-        vix_hist = vix.history(period="1d")
+        with metrics.span("upstream", call="yfinance.history"):
+            vix_hist = yf.Ticker("^VIX").history(period="1d")
         if not vix_hist.empty:
             vix_value = round(vix_hist['Close'].iloc[-1], 2)
-            vix_data = VixData(
+            return VixData(
                 value=vix_value,
                 level=get_vix_level(vix_value)
             )
     except Exception as e:
         print(f"Error fetching VIX: {e}")
+    return None
+
+
+def fetch_quote(ticker: str) -> Optional[StockQuote]:
+    """单只报价（Finnhub）；限流时抛 ratelimit.Throttled"""
+    if not fh_client:
+        return None
+    try:
+        q = finnhub_call("finnhub.quote", fh_client.quote, ticker)
+        return StockQuote(
+            ticker=ticker,
+            price=q.get('c', 0),
+            change=q.get('d', 0),
+            changePercent=q.get('dp', 0),
+            previousClose=q.get('pc', 0)
+        )
+    except ratelimit.Throttled:
+        raise
+    except Exception as e:
+        print(f"Finnhub error: {e}")
+    return None
+
+
+def download_history(tickers: List[str], start: str):
+    """日线补齐（price_store 调用，只在本地缺交易日时发生）"""
+    with metrics.span("upstream", call="yfinance.download"):
+        return yf.download(tickers, start=start, interval="1d", progress=False,
+                           auto_adjust=False, group_by="column")
+
+
+def refresh_history(ticker: str):
+    """补齐本地日线库里缺失的交易日（52 周区间用）"""
+    try:
+        price_store().refresh([ticker], download_history)
+    except Exception as e:
+        print(f"Price history error: {e}")
+
+
+def fetch_info(ticker: str) -> dict:
+    """yfinance info（只在基本面缓存未命中时调用，计入上游耗时）"""
+    with metrics.span("upstream", call="yfinance.info"):
+        return yf.Ticker(ticker).info
+
+
+def fetch_fundamentals(ticker: str) -> Optional[StockFundamentals]:
+    """基本面（yfinance，经本地缓存）；依赖价格的 52 周位置和目标价空间由 apply_price 补上"""
+    try:
+        info = fundamentals_cache().get_info(ticker, lambda: fetch_info(ticker))
+        refresh_history(ticker)
+        return StockFundamentals(
+            ticker=ticker,
+            companyName=info.get('shortName') or ticker,
+            sector=info.get('sector') or 'Unknown',
+            pe=info.get('trailingPE'),
+            forwardPe=info.get('forwardPE'),
+            marketCap=info.get('marketCap'),
+            week52High=info.get('fiftyTwoWeekHigh'),
+            week52Low=info.get('fiftyTwoWeekLow'),
+            week52Position=None,
+            beta=info.get('beta'),
+            targetPrice=info.get('targetMeanPrice'),
+            upside=None
+        )
+    except Exception as e:
+        print(f"yfinance error: {e}")
+    return None
+
+
+def apply_price(ticker: str, fundamentals: StockFundamentals, price: Optional[float]) -> StockFundamentals:
+    """按价格算 52 周位置和目标价上涨空间
+    
+    price 为实时报价，没有时取本地日线最后一个收盘价；本地有日线时 52 周区间按本地计算（计入实时价），
+    否则用 info 的区间（与 push_telegram 一致）。
+    """
+    high, low, position = fundamentals.week52High, fundamentals.week52Low, None
+    week52 = price_store().week52(ticker, price)
+    if week52:
+        price = week52["price"]
+        if week52["position"] is not None:
+            high, low, position = week52["high"], week52["low"], week52["position"]
+    if position is None and price and high and low and high > low:
+        position = round(((price - low) / (high - low)) * 100, 1)
+    
+    upside = None
+    target = fundamentals.targetPrice
+    if target and price:
+        upside = round(((target - price) / price) * 100, 1)
+    
+    return fundamentals.model_copy(update={
+        "week52High": high, "week52Low": low, "week52Position": position, "upside": upside,
+    })
+
+
+def fetch_analyst(ticker: str) -> Optional[AnalystRating]:
+    """分析师评级（Finnhub）；限流时抛 ratelimit.Throttled"""
+    if not fh_client:
+        return None
+    try:
+        rec = finnhub_call("finnhub.recommendation_trends", fh_client.recommendation_trends, ticker)
+        if rec:
+            latest = rec[0]
+            buy = latest.get('buy', 0) + latest.get('strongBuy', 0)
+            hold = latest.get('hold', 0)
+            sell = latest.get('sell', 0) + latest.get('strongSell', 0)
+            return AnalystRating(
+                ticker=ticker,
+                buyCount=buy,
+                holdCount=hold,
+                sellCount=sell,
+                consensus=get_analyst_consensus(buy, hold, sell)
+            )
+    except ratelimit.Throttled:
+        raise
+    except Exception as e:
+        print(f"Analyst rating error: {e}")
+    return None
+
+
+# ============== API 端点 ==============
+
+@app.get("/")
+async def root():
+    return {"message": "My Personal Bloomberg API", "status": "running"}
+
+
+async def build_market_overview() -> MarketOverview:
+    """三个指数和 VIX 并发获取"""
+    *indices, vix_data = await asyncio.gather(
+        *(run_blocking(fetch_index, ticker, name) for ticker, name in MARKET_INDICES),
+        run_blocking(fetch_vix),
+    )
     
     # 获取费城联储指数（需要 FRED API）
     philly_fed = None
@@ -222,189 +650,264 @@ async def get_market_overview():
     
     return MarketOverview(
         timestamp=get_est_time(),
-        indices=indices,
+        indices=[i for i in indices if i is not None],
         vix=vix_data,
         phillyFed=philly_fed
     )
 
 
-@app.get("/api/stock/{ticker}")
-async def get_stock_data(ticker: str):
-    """获取单只股票的详细数据"""
+STOCK_PARTS = ("quote", "fundamentals", "analyst")
+
+
+async def build_stock_data(ticker: str) -> dict:
+    """报价、基本面、分析师评级并发获取；Finnhub 限流的项为 None，列在 throttled 里"""
+    parts = await asyncio.gather(
+        run_blocking(fetch_quote, ticker),
+        run_blocking(fetch_fundamentals, ticker),
+        run_blocking(fetch_analyst, ticker),
+        return_exceptions=True,
+    )
+    data = {"success": True}
+    throttled = []
+    for name, part in zip(STOCK_PARTS, parts):
+        if isinstance(part, ratelimit.Throttled):
+            throttled.append(name)
+            part = None
+        elif isinstance(part, BaseException):
+            raise part
+        data[name] = part
+    data["throttled"] = throttled
+    if data["fundamentals"] is not None:
+        quote = data["quote"]
+        data["fundamentals"] = await run_blocking(
+            apply_price, ticker, data["fundamentals"], quote.price if quote and quote.price else None)
+    return data
+
+
+async def cached_market_overview():
+    """市场概览的缓存 Payload（REST 接口和 SSE 推送共用）"""
+    return await cached(
+        "market-overview", "market-overview", build_market_overview,
+        cacheable=lambda overview: bool(overview["indices"]),
+    )
+
+
+@app.get("/api/market-overview", response_model=MarketOverview)
+async def get_market_overview(request: Request):
+    """获取市场概览数据（经响应缓存，过期后先返回旧值再后台刷新）"""
+    payload, state = await cached_market_overview()
+    return send(request, payload, {"X-Cache": state.upper()})
+
+
+# 批量接口单次最多的 ticker 数：不超过 Finnhub 令牌桶的突发容量，超出部分只会被限流
+MAX_BATCH_TICKERS = min(int(os.getenv("MAX_BATCH_TICKERS", "50")), ratelimit.PROVIDER_LIMITS["finnhub"][1])
+TICKER_PATTERN = re.compile(r"^[A-Z0-9.^-]{1,10}$")
+
+
+async def cached_stock(ticker: str):
+    """单只股票数据（经响应缓存，与批量接口共用），返回 (payload, 缓存状态)
     
+    有限流缺项的结果不写缓存，下次请求重新取。
+    """
+    return await cached(
+        "stock", f"stock:{ticker}", lambda: build_stock_data(ticker),
+        cacheable=lambda data: any(data[k] is not None for k in STOCK_PARTS) and not data["throttled"],
+    )
+
+
+@app.get("/api/stock/{ticker}")
+async def get_stock_data(ticker: str, request: Request):
+    """获取单只股票的详细数据（经响应缓存）"""
     ticker = ticker.upper()
+    if not TICKER_PATTERN.match(ticker):
+        raise HTTPException(status_code=400, detail="无效的股票代码")
+    payload, state = await cached_stock(ticker)
+    return send(request, payload, {"X-Cache": state.upper()})
+
+
+@app.get("/api/stocks")
+async def get_stocks(tickers: str, request: Request):
+    """批量获取多只股票（逗号分隔），并发取数，逐只返回状态
+
+    status: ok（三项齐全）/ partial（部分缺失）/ throttled（Finnhub 限流，已取到的项照常返回）/
+    error（全部失败）/ invalid（代码不合法）
+    """
+    symbols = list(dict.fromkeys(t.strip().upper() for t in tickers.split(",") if t.strip()))
+    if not symbols:
+        raise HTTPException(status_code=400, detail="tickers 不能为空")
+    if len(symbols) > MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400, detail=f"单次最多 {MAX_BATCH_TICKERS} 只股票")
     
-    # 获取报价
-    quote = None
-    if fh_client:
-        try:
-            q = fh_client.quote(ticker)
-            quote = StockQuote(
-                ticker=ticker,
-                price=q.get('c', 0),
-                change=q.get('d', 0),
-                changePercent=q.get('dp', 0),
-                previousClose=q.get('pc', 0)
-            )
-        except Exception as e:
-            print(f"Finnhub error: {e}")
+    valid = [t for t in symbols if TICKER_PATTERN.match(t)]
+    fetched = await asyncio.gather(*(cached_stock(t) for t in valid), return_exceptions=True)
+    results = dict(zip(valid, fetched))
+    
+    data = []
+    for ticker in symbols:
+        item = {"ticker": ticker, "status": "invalid", "cache": None, "error": None}
+        item.update({k: None for k in STOCK_PARTS})
+        result = results.get(ticker)
+        if isinstance(result, Exception):
+            item.update(status="error", error=str(result))
+        elif result is not None:
+            payload, state = result
+            stock = payload.data
+            present = sum(stock[k] is not None for k in STOCK_PARTS)
+            item.update({k: stock[k] for k in STOCK_PARTS})
+            item["cache"] = state
+            if stock.get("throttled"):
+                item.update(status="throttled", error="限流: " + ", ".join(stock["throttled"]))
+            else:
+                item["status"] = "ok" if present == len(STOCK_PARTS) else "partial" if present else "error"
+        else:
+            item["error"] = "无效的股票代码"
+        data.append(item)
+    
+    return send(request, Payload({
+        "success": True,
+        "count": len(data),
+        "failed": [d["ticker"] for d in data if d["status"] in ("error", "invalid")],
+        "data": data,
+    }))
+
+
+# ============== 实时报价推送（SSE） ==============
+
+STREAM_DEFAULT_SYMBOLS = [t for t, _ in MARKET_INDICES] + ["^VIX"]
+MAX_STREAM_SYMBOLS = int(os.getenv("MAX_STREAM_SYMBOLS", "20"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+
+async def fetch_stream_quote(symbol: str) -> Optional[dict]:
+    """推送用的单个 symbol 报价；^VIX 返回 value/level，其余返回 MarketIndex 字段
+    
+    指数和 VIX 直接取市场概览的缓存，不单独请求上游；其他 symbol 在推送专用线程池里拉取。
+    """
+    if symbol in STREAM_DEFAULT_SYMBOLS:
+        payload, _ = await cached_market_overview()
+        overview = payload.data
+        if symbol == "^VIX":
+            return overview["vix"]
+        return next((i for i in overview["indices"] if i["ticker"] == symbol), None)
+    index = await run_blocking(fetch_index, symbol, symbol, executor=_stream_executor)
+    return index.model_dump() if index else None
+
+
+quote_hub = quote_stream.register(QuoteHub(fetch_stream_quote))
+
+
+@app.get("/api/stream/quotes")
+async def stream_quotes(request: Request, tickers: Optional[str] = None):
+    """SSE 实时报价：每个 symbol 一个共享轮询任务，只推送变化的值
+    
+    默认订阅 SPY/QQQ/DIA/^VIX；每条事件为 `event: quote`，data 为 {"symbol", "quote"}。
+    全局轮询的 symbol 数达到上限时返回 503。
+    """
+    symbols = STREAM_DEFAULT_SYMBOLS
+    if tickers:
+        symbols = list(dict.fromkeys(t.strip().upper() for t in tickers.split(",") if t.strip()))
+        if not symbols or len(symbols) > MAX_STREAM_SYMBOLS or not all(TICKER_PATTERN.match(t) for t in symbols):
+            raise HTTPException(status_code=400, detail=f"tickers 需为 1~{MAX_STREAM_SYMBOLS} 个合法代码")
     
-    # 获取基本面（yfinance）
-    fundamentals = None
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        
-        # 计算 52 周位置
-        week52_pos = None
-        high = info.get('fiftyTwoWeekHigh')
-        low = info.get('fiftyTwoWeekLow')
-        price = info.get('currentPrice') or info.get('regularMarketPrice')
-        if high and low and price and high != low:
-            week52_pos = round(((price - low) / (high - low)) * 100, 1)
-        
-        # 计算目标价上涨空间
-        upside = None
-        target = info.get('targetMeanPrice')
-        if target and price:
-            upside = round(((target - price) / price) * 100, 1)
-        
-        fundamentals = StockFundamentals(
-            ticker=ticker,
-            companyName=info.get('shortName', ticker),
-            sector=info.get('sector', 'Unknown'),
-            pe=info.get('trailingPE'),
-            forwardPe=info.get('forwardPE'),
-            marketCap=info.get('marketCap'),
-            week52High=high,
-            week52Low=low,
-            week52Position=week52_pos,
-            beta=info.get('beta'),
-            targetPrice=target,
-            upside=upside
-        )
-    except Exception as e:
-        print(f"yfinance error: {e}")
+        sub = quote_hub.subscribe(symbols)
+    except HubFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     
-    # 获取分析师评级
-    analyst = None
-    if fh_client:
+    async def events():
         try:
-            rec = fh_client.recommendation_trends(ticker)
-            if rec:
-                latest = rec[0]
-                buy = latest.get('buy', 0) + latest.get('strongBuy', 0)
-                hold = latest.get('hold', 0)
-                sell = latest.get('sell', 0) + latest.get('strongSell', 0)
-                analyst = AnalystRating(
-                    ticker=ticker,
-                    buyCount=buy,
-                    holdCount=hold,
-                    sellCount=sell,
-                    consensus=get_analyst_consensus(buy, hold, sell)
-                )
-        except Exception as e:
-            print(f"Analyst rating error: {e}")
+            while not await request.is_disconnected():
+                try:
+                    symbol, quote = await sub.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # 心跳，防止代理断开空闲连接
+                    continue
+                payload = json.dumps({"symbol": symbol, "quote": quote}, ensure_ascii=False)
+                yield f"event: quote\ndata: {payload}\n\n"
+        finally:
+            quote_hub.unsubscribe(sub)
     
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """本地缓存命中、上游限流与连接复用统计"""
     return {
         "success": True,
-        "quote": quote,
-        "fundamentals": fundamentals,
-        "analyst": analyst
+        "fundamentals": fundamentals_cache().stats(),
+        "analysis": analysis_cache().stats(),
+        "responses": response_cache().stats(),
+        "stream": quote_hub.stats(),
+        "prices": price_store().stats(),
+        "rateLimits": ratelimit.stats(),
+        "connections": http_pool.stats(),
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus 文本格式：端点延迟、上游耗时与错误、缓存命中、限流与连接复用"""
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/news")
-async def get_news(limit: int = 4):
-    """获取新闻并进行 AI 分析"""
+async def get_news(request: Request, limit: int = 20, since: Optional[int] = None, cursor: Optional[int] = None):
+    """获取已分析好的新闻卡片（后台预先生成，直接从内存返回）
     
-    # TODO: 实现以下步骤
-    # 1. 从 WSJ RSS 抓取新闻
-    # 2. 为每条新闻提取相关股票
-    # 3. 获取股票数据
-    # 4. 调用 Gemini AI 进行分析
-    # 5. 返回 NewsCard 列表
+    - since: 上次拿到的 latest，只返回之后新生成的卡片
+    - cursor: 上一页返回的 nextCursor，继续往旧翻
     
-    # 临时返回模拟数据
-    return {
+    关闭后台刷新时（NEWS_REFRESH=0），库为空或到了刷新间隔的请求会先同步刷新一轮。
+    """
+    limit = max(1, min(limit, 100))
+    if not NEWS_BACKGROUND_REFRESH and news_refresher.due():
+        await news_refresher.refresh()
+    page, next_cursor = news_store.page(since=since, cursor=cursor, limit=limit)
+    return send(request, Payload({
         "success": True,
-        "data": [
-            {
-                "id": "1",
-                "title": "示例新闻标题",
-                "source": "WSJ",
-                "publishedAt": get_est_time(),
-                "ticker": "AAPL",
-                "quote": None,
-                "fundamentals": None,
-                "analyst": None,
-                "analysis": {
-                    "score": 6,
-                    "signal": "中性",
-                    "coreJudgment": "这是一条示例新闻，请实现真实的新闻抓取和AI分析。",
-                    "causalChain": "新闻事件 → 市场反应 → 股价影响",
-                    "valuationView": "请连接真实数据源",
-                    "risk": "数据为模拟数据",
-                    "recommendation": "请完成后端开发"
-                }
-            }
-        ]
-    }
+        "data": [card for _, card in page],
+        "latest": news_store.latest,
+        "nextCursor": next_cursor,
+        "updatedAt": news_store.updated_at,
+        "refreshing": news_refresher.running,
+        "error": news_refresher.last_error,
+    }))
 
 
 @app.get("/api/analyze")
 async def analyze_news(title: str, ticker: str):
-    """使用 AI 分析新闻"""
-    
-    # TODO: 实现 Gemini AI 分析
-    # 参考 push_telegram.py 中的 analyze_with_ai 函数
+    """使用 AI 分析新闻（复用 push_telegram 的分析引擎和分析缓存）"""
     
-    return {
-        "success": True,
-        "analysis": {
-            "score": 5,
-            "signal": "中性",
-            "coreJudgment": "AI 分析功能待实现",
-            "causalChain": "请配置 GEMINI_KEY",
-            "valuationView": "请参考 push_telegram.py",
-            "risk": "功能待开发",
-            "recommendation": "请完成 Gemini 集成"
+    pipeline = load_pipeline()
+    if pipeline is None:
+        return {
+            "success": True,
+            "analysis": {
+                "score": 5,
+                "signal": "中性",
+                "coreJudgment": "AI 分析功能待实现",
+                "causalChain": "请配置 GEMINI_KEY",
+                "valuationView": "请参考 push_telegram.py",
+                "risk": "功能待开发",
+                "recommendation": "请完成 Gemini 集成"
+            }
         }
-    }
+    
+    # 内容寻址缓存命中时不会调用模型
+    result = await run_blocking(pipeline.analyze_with_ai, title, ticker.upper(), {})
+    return {"success": True, "analysis": to_ai_analysis(result)}
 
 
 # ============== Vercel 配置 ==============
-"""
-创建 vercel.json 文件：
-
-{
-  "builds": [
-    {
-      "src": "main.py",
-      "use": "@vercel/python"
-    }
-  ],
-  "routes": [
-    {
-      "src": "/(.*)",
-      "dest": "main.py"
-    }
-  ]
-}
-
-创建 requirements.txt 文件：
-
-fastapi
-uvicorn
-finnhub-python
-yfinance
-google-genai
-requests
-pytz
-pydantic
-"""
+# 见仓库根目录的 vercel.json：入口为 backend/api_template.py，includeFiles 打包根目录的
+# 共享模块（*.py）、data/ 和 feeds.json；依赖见 backend/requirements.txt。
 
 
 if __name__ == "__main__":
+    # 在仓库根目录执行：python -m backend.api_template
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
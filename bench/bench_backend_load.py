@@ -0,0 +1,133 @@
+"""
+后端压测
+========
+对 backend/api_template.py 的端点做并发压测，看吞吐是否随并发客户端数增长。
+
+默认在进程内通过 httpx 的 ASGITransport 直接驱动 FastAPI 应用（与 uvicorn 一样
+单事件循环），上游换成 bench/replay.py 的回放替身并模拟延迟。--inline 让上游调用
+直接在事件循环里执行（改造前的行为），--no-cache 关掉响应缓存，用来对比。
+--url 则压测一个已启动的服务。
+
+Finnhub 按真实的默认配额（FINNHUB_RPM / FINNHUB_BURST）限流，超出配额的股票在响应里
+标为 throttled 并计入「限流」列；--unlimited 去掉配额，只看本地开销。
+
+    python bench/bench_backend_load.py
+    python bench/bench_backend_load.py --endpoint /api/stock/AAPL --concurrency 1 4 16
+    python bench/bench_backend_load.py --endpoint "/api/stocks?tickers=AAPL,MSFT,NVDA,TSLA,AMZN" --no-cache
+    python bench/bench_backend_load.py --no-cache
+    python bench/bench_backend_load.py --no-cache --inline
+    python bench/bench_backend_load.py --url http://localhost:8000 --requests 200
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx  # noqa: E402
+
+
+def load_app(args):
+    """导入后端并换上回放上游"""
+    os.environ.setdefault("BLOOMBERG_CACHE_DIR", tempfile.mkdtemp(prefix="bloomberg-load-"))
+    if args.unlimited:
+        os.environ.setdefault("FINNHUB_RPM", "1000000")
+        os.environ.setdefault("FINNHUB_BURST", "100000")
+
+    import replay
+    from backend import api_template as api
+
+    fixtures = replay.Fixtures(args.fixtures, scale=args.scale)
+    api.fh_client = replay.ReplayFinnhub(fixtures)
+    api.yf = replay.ReplayYFinance(fixtures)
+    if args.no_cache:
+        for route in api.CACHE_TTLS:
+            api.CACHE_TTLS[route] = (0, 0)
+    if args.inline:
+        async def run_inline(fn, *a, executor=None):
+            return fn(*a)
+        api.run_blocking = run_inline
+    return api.app
+
+
+async def measure(client, path, requests, concurrency):
+    latencies, errors, throttled = [], 0, 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors, throttled
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                resp = await client.get(path)
+                if resp.status_code != 200:
+                    errors += 1
+                else:
+                    throttled += count_throttled(resp.json())
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": requests / wall,
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "errors": errors,
+        "throttled": throttled,
+    }
+
+
+def count_throttled(body):
+    """响应里被 Finnhub 限流的股票数（/api/stocks 逐只的 status，/api/stock 的 throttled 列表）"""
+    if isinstance(body.get("data"), list):
+        return sum(item.get("status") == "throttled" for item in body["data"])
+    return int(bool(body.get("throttled")))
+
+
+async def main_async(args):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        target = args.url
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=load_app(args)),
+                                   base_url="http://bench", timeout=60)
+        target = "进程内（上游在事件循环里阻塞执行）" if args.inline else "进程内（有界线程池）"
+
+    print(f"🎯 {args.endpoint} | {target} | 每档 {args.requests} 个请求")
+    print(f"   {'并发':>4}{'吞吐 req/s':>12}{'p50':>10}{'p95':>10}{'错误':>6}{'限流':>6}")
+    async with client:
+        await client.get(args.endpoint)  # 预热：建连接、导入、填缓存
+        base = None
+        for c in args.concurrency:
+            r = await measure(client, args.endpoint, args.requests, c)
+            base = base or r["rps"]
+            print(f"   {c:>4}{r['rps']:>12.1f}{r['p50'] * 1000:>8.0f}ms{r['p95'] * 1000:>8.0f}ms{r['errors']:>6}{r['throttled']:>6}"
+                  f"   ×{r['rps'] / base:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", default="/api/market-overview")
+    parser.add_argument("--requests", type=int, default=64, help="每个并发档位的请求总数")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--scale", type=float, default=0.25, help="模拟上游延迟系数")
+    parser.add_argument("--fixtures", help="回放用夹具 JSON")
+    parser.add_argument("--inline", action="store_true", help="上游调用直接在事件循环执行（改造前的行为）")
+    parser.add_argument("--no-cache", action="store_true", help="关闭响应缓存，每个请求都打到上游")
+    parser.add_argument("--unlimited", action="store_true", help="去掉 Finnhub 配额（默认按真实配额限流）")
+    parser.add_argument("--url", help="压测已启动的服务，而不是进程内应用")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+导入耗时报告
+============
+在干净的子进程里（不带任何凭证环境变量）用 `python -X importtime` 导入目标模块，
+汇总总耗时、最重的依赖，并检查重量级依赖是否被提前加载。
+
+    python bench/bench_import.py                      # import push_telegram
+    python bench/bench_import.py --module feeds --top 15
+    python bench/bench_import.py --touch              # 再调用一次各客户端访问器，对比懒加载省下的时间
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只应在首次使用时加载的依赖
+HEAVY_MODULES = ["yfinance", "pandas", "numpy", "google.genai", "finnhub", "feedparser", "requests"]
+
+CREDENTIAL_ENV = ["LARK_APP_ID", "LARK_APP_SECRET", "LARK_CHAT_ID", "FINNHUB_KEY", "GEMINI_KEY", "FRED_KEY"]
+
+
+def run_importtime(code):
+    """运行 code，返回 (stderr 里的 importtime 行, stdout)"""
+    env = {k: v for k, v in os.environ.items() if k not in CREDENTIAL_ENV}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows, proc.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="push_telegram")
+    parser.add_argument("--top", type=int, default=10, help="列出最重的前 N 个顶层依赖")
+    parser.add_argument("--touch", action="store_true", help="额外测量创建 finnhub / gemini / yfinance 客户端的耗时")
+    args = parser.parse_args()
+
+    probe = (
+        f"import sys, time; t = time.perf_counter(); import {args.module}; "
+        "print(time.perf_counter() - t); "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    rows, out = run_importtime(probe)
+    wall, loaded = out.splitlines()[:2]
+    own = next((cum for name, _, cum in rows if name.strip() == args.module), 0)
+
+    print(f"📦 import {args.module}: {float(wall) * 1000:.1f} ms（importtime 累计 {own / 1000:.1f} ms，无凭证）")
+    # importtime 先列子模块再列父模块，缩进每层 2 个空格：目标模块之前、深度为 1 的行即其直接依赖
+    top, children = [], []
+    for name, _, cum in rows:
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            if name.strip() == args.module:
+                top = children
+            children = []
+        elif depth == 1:
+            children.append((name.strip(), cum))
+    top.sort(key=lambda r: -r[1])
+    print(f"\n   最重的直接依赖（前 {args.top}）")
+    for name, cum in top[:args.top]:
+        print(f"   {name:<32}{cum / 1000:>9.1f} ms")
+    print(f"\n   已加载的重量级依赖: {loaded or '无'}")
+
+    if args.touch and args.module == "push_telegram":
+        probe = (
+            "import os, time; [os.environ.setdefault(k, 'x') for k in "
+            f"{CREDENTIAL_ENV!r}]; import push_telegram as pt; "
+            "t = time.perf_counter(); pt.yfinance(); pt.finnhub_client(); pt.gemini_client(); "
+            "print(time.perf_counter() - t)"
+        )
+        _, out = run_importtime(probe)
+        print(f"\n   首次创建 yfinance / finnhub / gemini 客户端: {float(out.strip()) * 1000:.1f} ms（推迟到真正用到时）")
+
+
+if __name__ == "__main__":
+    main()
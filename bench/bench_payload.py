@@ -0,0 +1,135 @@
+"""
+响应体积 / 序列化耗时
+=====================
+对 backend/api_template.py 的几个主要端点，比较每种表示的字节数和编码耗时：
+
+- 逐请求转换：FastAPI 默认路径，jsonable_encoder(模型) + JSON（改造前每个请求都要做）
+- JSON / msgpack × 不压缩 / gzip / br：Payload 第一次编码的耗时；缓存命中后为 0
+- 304：If-None-Match 命中时只回头部
+
+数据由 bench/replay.py 的合成上游生成，新闻卡片用合成的 AI 分析填满。
+
+    python bench/bench_payload.py
+    python bench/bench_payload.py --tickers 50 --cards 100 --repeat 200
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_api():
+    os.environ.setdefault("BLOOMBERG_CACHE_DIR", tempfile.mkdtemp(prefix="bloomberg-payload-"))
+    os.environ.setdefault("FINNHUB_RPM", "1000000")
+    os.environ.setdefault("FINNHUB_BURST", "100000")
+    os.environ["NEWS_REFRESH"] = "0"
+
+    import replay
+    from backend import api_template as api
+
+    fixtures = replay.Fixtures(scale=0)
+    api.fh_client = replay.ReplayFinnhub(fixtures)
+    api.yf = replay.ReplayYFinance(fixtures)
+    return api, replay
+
+
+def news_cards(api, replay, count):
+    """合成 count 张新闻卡片（与 NewsRefresher 产出的结构相同）"""
+    item = {"score": 6, "core": "基本面稳健，短期影响有限。" * 3, "logic": "业绩稳定 → 估值支撑 → 股价震荡",
+            "valuation": "估值接近行业均值，前瞻市盈率略低于五年中位数。", "risk": "宏观需求放缓，监管不确定性。",
+            "action": "持有者观望，空仓者等待回调至支撑位附近再分批建仓。"}
+    cards = []
+    for i in range(count):
+        ticker = f"T{i % 40}"
+        q = replay.synth_quote(ticker)
+        info = replay.synth_info(ticker)
+        data = {
+            "quote": {"price": q["c"], "prev": q["pc"], "change": q["dp"]},
+            "fundamentals": {
+                "short_name": info["shortName"], "sector": info["sector"], "pe": info["trailingPE"],
+                "forward_pe": info["forwardPE"], "market_cap": info["marketCap"],
+                "week_52_high": info["fiftyTwoWeekHigh"], "week_52_low": info["fiftyTwoWeekLow"],
+                "beta": info["beta"], "target_price": info["targetMeanPrice"],
+            },
+            "analyst": {"buy": 12, "hold": 5, "sell": 1, "consensus": "买入"},
+            "week_52_position": 55.0, "upside": 10.0,
+        }
+        entry = {"link": f"https://example.com/news/{i}", "title": f"{ticker} 发布季度财报，营收超出市场预期 {i}",
+                 "source": "Reuters", "published": "2024-05-01 09:30"}
+        cards.append(api.to_news_card(entry, ticker, data, item))
+    return cards
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def build_endpoints(api, replay, args):
+    """端点 → 路由实际返回的原始对象（模型 / 含模型的 dict）"""
+    tickers = [f"T{i}" for i in range(args.tickers)]
+
+    async def stocks():
+        results = await asyncio.gather(*(api.build_stock_data(t) for t in tickers))
+        return {"success": True, "count": len(results), "failed": [],
+                "data": [dict(r, ticker=t, status="ok", cache="miss", error=None) for t, r in zip(tickers, results)]}
+
+    async def build():
+        return {
+            "/api/market-overview": await api.build_market_overview(),
+            "/api/stock/AAPL": await api.build_stock_data("AAPL"),
+            f"/api/stocks ({args.tickers})": await stocks(),
+            f"/api/news ({args.cards})": {"success": True, "data": news_cards(api, replay, args.cards),
+                                          "latest": args.cards, "nextCursor": None},
+        }
+
+    return asyncio.run(build())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=20, help="/api/stocks 批量的股票数")
+    parser.add_argument("--cards", type=int, default=20, help="/api/news 一页的卡片数")
+    parser.add_argument("--repeat", type=int, default=100, help="每项计时的重复次数")
+    args = parser.parse_args()
+
+    api, replay = load_api()
+    import payload as payload_mod
+    from fastapi.encoders import jsonable_encoder
+
+    variants = [(fmt, coding) for fmt in payload_mod.ENCODERS for coding in [None, *payload_mod.COMPRESSORS]]
+    missing = [name for name, mod in (("msgpack", payload_mod.msgpack), ("brotli", payload_mod.brotli)) if mod is None]
+    if missing:
+        print(f"⚠️ 未安装 {', '.join(missing)}，对应表示跳过")
+
+    for endpoint, raw in build_endpoints(api, replay, args).items():
+        per_request, data = timed(lambda: jsonable_encoder(raw), args.repeat)
+        json_time, _ = timed(lambda: payload_mod.Payload(data).body("json"), args.repeat)
+        print(f"\n📦 {endpoint}")
+        print(f"   逐请求转换（jsonable_encoder + JSON）: {(per_request + json_time) * 1000:.3f}ms")
+        print(f"   {'表示':<16}{'字节':>8}{'占比':>8}{'首次编码':>12}")
+        base = None
+        for fmt, coding in variants:
+            elapsed, body = timed(lambda: payload_mod.Payload(data).body(fmt, coding), args.repeat)
+            base = base or len(body)
+            name = fmt if coding is None else f"{fmt}+{coding}"
+            print(f"   {name:<16}{len(body):>8}{len(body) / base:>8.0%}{elapsed * 1000:>10.3f}ms")
+        cached = payload_mod.Payload(data)
+        cached.body("json", "gzip")
+        hit, _ = timed(lambda: cached.render(None, "gzip", None), args.repeat)
+        etag = cached.etag("json", "gzip")
+        not_modified, _ = timed(lambda: cached.render(None, "gzip", etag), args.repeat)
+        print(f"   缓存命中复用 {hit * 1e6:.1f}µs，304 {not_modified * 1e6:.1f}µs（0 字节响应体）")
+
+
+if __name__ == "__main__":
+    main()
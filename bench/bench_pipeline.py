@@ -0,0 +1,172 @@
+"""
+推送流水线基准（无需任何凭证）
+==============================
+用 bench/replay.py 的回放替身替换所有上游（Finnhub / yfinance / FRED / RSS /
+Gemini / Lark），跑一遍完整的 push_telegram.run()，输出各阶段耗时和端到端墙钟。
+
+合成一个 RSS 源：N 条新闻轮流提到 M 只股票。上游延迟按 DEFAULT_LATENCY 模拟，
+可用 --latency gemini=800 覆盖（毫秒），或 --scale 0 去掉全部延迟只测本地开销。
+同一个缓存目录下连跑 --runs 次：第一次是冷缓存，之后是热缓存。
+
+    python bench/bench_pipeline.py --articles 8 --tickers 4
+    python bench/bench_pipeline.py --articles 20 --tickers 10 --workers 8 --no-batch --json
+    python bench/bench_pipeline.py --chats 24                                # 同一批卡片扇出到 24 个群
+    python bench/bench_pipeline.py --fixtures bench/fixtures.json            # 回放录制的响应
+    python bench/bench_pipeline.py --record bench/fixtures.json              # 用真实凭证录制
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+from email.utils import formatdate
+from xml.sax.saxutils import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+FEED_URL = "https://bench.invalid/rss.xml"
+
+# 都是 COMPANY_MAP 里不歧义的公司名，保证能识别出可信 ticker
+COMPANIES = [
+    "Nvidia", "Microsoft", "Tesla", "Netflix", "Boeing", "Exxon", "Chevron", "Disney",
+    "Nike", "Starbucks", "Walmart", "Costco", "Pfizer", "Intel", "Airbnb", "Doordash",
+    "JPMorgan", "Goldman", "Pepsi", "UnitedHealth",
+]
+WORDS = (
+    "shares jump slide after quarterly results beat miss forecasts guidance raised cut "
+    "regulators probe deal talks supply chain layoffs record demand chip pricing margins "
+    "buyback dividend outlook analysts upgrade downgrade lawsuit settlement expansion"
+).split()
+
+
+def parse_latency(values):
+    latency = {}
+    for item in values or []:
+        name, _, ms = item.partition("=")
+        latency[name] = float(ms) / 1000
+    return latency
+
+
+def make_feed(articles, tickers, seed):
+    """N 条新闻，公司名按 M 只轮换；正文随机词保证不会被跨源去重折叠"""
+    rng = random.Random(seed)
+    companies = COMPANIES[:max(1, min(tickers, len(COMPANIES)))]
+    items = []
+    for i in range(articles):
+        words = " ".join(rng.sample(WORDS, 7))
+        title = f"{companies[i % len(companies)]} {words} ({i})"
+        items.append(
+            f"<item><title>{escape(title)}</title><link>https://bench.invalid/{i}</link>"
+            f"<guid>bench-{seed}-{i}</guid><pubDate>{formatdate()}</pubDate>"
+            f"<description>{escape(words)}</description></item>"
+        )
+    return f"<rss version=\"2.0\"><channel><title>bench</title>{''.join(items)}</channel></rss>"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=8, help="新闻条数 N")
+    parser.add_argument("--tickers", type=int, default=4, help="涉及的股票数 M")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chats", type=int, default=1, help="卡片发往的飞书群数（多群扇出）")
+    parser.add_argument("--no-batch", action="store_true", help="逐条调用 AI（AI_BATCH=0）")
+    parser.add_argument("--runs", type=int, default=1, help="同一缓存目录下连跑次数（第 2 次起为热缓存）")
+    parser.add_argument("--latency", action="append", metavar="PROVIDER=MS", help="覆盖模拟延迟，可重复")
+    parser.add_argument("--scale", type=float, default=1.0, help="所有模拟延迟乘以该系数")
+    parser.add_argument("--real-limits", action="store_true", help="保留真实的 RPM 限流（默认放开）")
+    parser.add_argument("--fixtures", help="回放用夹具 JSON（缺失的 key 用合成数据）")
+    parser.add_argument("--record", metavar="PATH", help="调用真实上游并把响应写入 PATH（需要完整环境变量）")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="最后输出一行 JSON 结果")
+    parser.add_argument("--verbose", action="store_true", help="显示流水线自身的输出")
+    args = parser.parse_args()
+
+    # 必须在 import push_telegram 之前设置：cfg、限流参数、缓存目录都在导入时读取
+    cache_dir = tempfile.mkdtemp(prefix="bloomberg-bench-")
+    os.environ["BLOOMBERG_CACHE_DIR"] = cache_dir
+    os.environ.pop("FEED_FIXTURE_DIR", None)
+    if not args.record:
+        if args.chats > 1:
+            os.environ["LARK_CHAT_ID"] = ",".join(f"bench-chat-{i}" for i in range(args.chats))
+        for name in ("LARK_APP_ID", "LARK_APP_SECRET", "LARK_CHAT_ID", "FINNHUB_KEY", "GEMINI_KEY", "FRED_KEY"):
+            os.environ.setdefault(name, "bench")
+    if not args.real_limits:
+        os.environ.setdefault("FINNHUB_RPM", "100000")
+        os.environ.setdefault("FINNHUB_BURST", "1000")
+        os.environ.setdefault("GEMINI_RPM", "100000")
+        os.environ.setdefault("GEMINI_BURST", "1000")
+        os.environ.setdefault("LARK_RPM", "100000")
+        os.environ.setdefault("LARK_BURST", "1000")
+
+    import replay
+    import http_pool
+    import feeds
+    import push_telegram as pt
+
+    fixtures = replay.Fixtures(args.fixtures or args.record, parse_latency(args.latency), args.scale)
+    if args.record:
+        recording = replay.Recording(fixtures, pt.finnhub_client(), pt.yfinance(), pt.gemini_client(), http_pool.session())
+        pt.set_client("finnhub", recording.finnhub)
+        pt.set_client("yfinance", recording.yfinance)
+        pt.set_client("gemini", recording.gemini)
+        session = recording.session
+    else:
+        pt.set_client("finnhub", replay.ReplayFinnhub(fixtures))
+        pt.set_client("yfinance", replay.ReplayYFinance(fixtures))
+        pt.set_client("gemini", replay.ReplayGemini(fixtures))
+        session = replay.ReplaySession(fixtures, {FEED_URL: make_feed(args.articles, args.tickers, args.seed)})
+        feeds_path = os.path.join(cache_dir, "feeds.json")
+        with open(feeds_path, "w", encoding="utf-8") as f:
+            json.dump({"feeds": [{"id": "bench", "source": "Bench", "url": FEED_URL}]}, f)
+        feeds.FEEDS_CONFIG = feeds_path
+    http_pool.session = lambda: session
+
+    pt.cfg["workers"] = args.workers
+    pt.cfg["news_limit"] = args.articles
+    pt.cfg["ai_batch"] = not args.no_batch
+    pt.cfg["incremental"] = False
+
+    results = []
+    for n in range(args.runs):
+        fixtures.calls.clear()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, "w")):
+            pt.run()
+        wall = time.perf_counter() - start
+        results.append({
+            "run": n + 1, "wall": round(wall, 3),
+            "stages": {k: {kk: round(vv, 4) if isinstance(vv, float) else vv for kk, vv in v.items()}
+                       for k, v in pt.timer.snapshot().items()},
+            "upstream_calls": dict(fixtures.calls),
+        })
+
+    if args.record:
+        fixtures.save()
+        print(f"📼 已录制 {len(fixtures.data)} 条响应 → {args.record}")
+
+    mode = "批量 AI" if pt.cfg["ai_batch"] else "逐条 AI"
+    print(f"📊 {args.articles} 条新闻 × {args.tickers} 只股票 | 并发 {args.workers} | {mode} | 延迟系数 {args.scale}")
+    for r in results:
+        label = "冷缓存" if r["run"] == 1 else "热缓存"
+        print(f"\n第 {r['run']} 次（{label}）墙钟 {r['wall']:.2f}s")
+        print(f"   {'阶段':<14}{'次数':>6}{'累计':>10}{'平均':>10}{'最慢':>10}")
+        for name, s in sorted(r["stages"].items(), key=lambda kv: -kv[1]["total"]):
+            print(f"   {name:<16}{s['calls']:>6}{s['total']:>9.2f}s{s['total'] / s['calls']:>9.2f}s{s['worst']:>9.2f}s")
+        calls = " ".join(f"{k}={v}" for k, v in sorted(r["upstream_calls"].items()))
+        print(f"   上游调用: {calls or '无'}")
+
+    if args.json:
+        print(json.dumps({
+            "articles": args.articles, "tickers": args.tickers, "workers": args.workers,
+            "ai_batch": pt.cfg["ai_batch"], "scale": args.scale, "runs": results,
+        }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
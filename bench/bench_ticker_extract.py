@@ -0,0 +1,93 @@
+"""
+Ticker 抽取基准
+===============
+对比旧的线性扫描（逐个别名做子串判断）和 Aho-Corasick 自动机。
+
+别名宇宙 = data/symbols.csv + 合成公司名（补足到 --aliases 个，模拟全美股名单），
+标题 = 随机填充词 + 0~2 个公司名。
+
+    python bench/bench_ticker_extract.py --headlines 10000 --aliases 8000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ticker_matcher  # noqa: E402
+
+FILLER = (
+    "shares rise fall after report earnings guidance investors market stocks "
+    "quarter sales profit deal talks regulators chip demand rate cut inflation "
+    "outlook analysts expect record slump rally supply chain layoffs"
+).split()
+SYLLABLES = ["zor", "vex", "tal", "mir", "quin", "dra", "lux", "pen", "cor", "fal", "bri", "nox", "sel", "tra"]
+SUFFIXES = ["holdings", "group", "systems", "therapeutics", "energy", "bancorp", "labs", "industries"]
+
+
+def synthetic_aliases(n, rng):
+    aliases = {}
+    while len(aliases) < n:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+        alias = f"{name} {rng.choice(SUFFIXES)}" if rng.random() < 0.5 else name
+        aliases[alias] = name[:4].upper()
+    return aliases
+
+
+def make_headlines(n, aliases, rng):
+    names = list(aliases)
+    headlines = []
+    for _ in range(n):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(6, 12))]
+        for _ in range(rng.choice([0, 1, 1, 2])):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(names).title())
+        headlines.append(" ".join(words).capitalize())
+    return headlines
+
+
+def linear_scan(text, aliases):
+    """旧实现：逐个别名做子串判断，返回第一个命中"""
+    text_lower = text.lower()
+    for company, ticker in aliases.items():
+        if company in text_lower:
+            return ticker
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--headlines", type=int, default=10000)
+    parser.add_argument("--aliases", type=int, default=8000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--skip-linear", action="store_true", help="跳过旧实现（别名很多时很慢）")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    aliases, _ = ticker_matcher.load_aliases()
+    aliases.update(synthetic_aliases(max(0, args.aliases - len(aliases)), rng))
+    headlines = make_headlines(args.headlines, aliases, rng)
+
+    start = time.perf_counter()
+    matcher = ticker_matcher.TickerMatcher(aliases)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = sum(1 for h in headlines if matcher.find(h))
+    ac = time.perf_counter() - start
+
+    print(f"别名 {len(aliases)} 个 | 自动机状态 {len(matcher._automaton)} | 标题 {len(headlines)} 条")
+    print(f"构建自动机      {build * 1000:9.1f} ms")
+    print(f"Aho-Corasick    {ac * 1000:9.1f} ms  ({ac / len(headlines) * 1e6:7.1f} µs/条, 命中 {found})")
+
+    if not args.skip_linear:
+        start = time.perf_counter()
+        found_linear = sum(1 for h in headlines if linear_scan(h, aliases))
+        linear = time.perf_counter() - start
+        print(f"线性扫描        {linear * 1000:9.1f} ms  ({linear / len(headlines) * 1e6:7.1f} µs/条, 命中 {found_linear})")
+        print(f"加速            {linear / ac:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
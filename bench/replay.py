@@ -0,0 +1,372 @@
+"""
+上游录制 / 回放
+===============
+把 push_telegram.py 用到的每个上游替换成可回放的替身：
+
+- finnhub.Client.quote / recommendation_trends
+- yfinance.Ticker(...).info / .history / yfinance.download
+- google-genai models.generate_content
+- http_pool.session() 上的 GET / POST（Lark、FRED、RSS）
+
+回放时按 key 查夹具（JSON），查不到就生成确定性的合成数据；每次调用按
+provider 睡眠模拟延迟。录制模式包装真实客户端，把响应写进夹具文件。
+"""
+
+import re
+import json
+import time
+import hashlib
+import threading
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+# provider → 模拟延迟（秒），可用 --latency provider=ms 覆盖
+DEFAULT_LATENCY = {
+    "finnhub": 0.12,
+    "yfinance_info": 0.60,
+    "yfinance_download": 0.40,
+    "yfinance_history": 0.35,
+    "gemini": 2.50,
+    "lark": 0.15,
+    "fred": 0.20,
+    "rss": 0.25,
+}
+
+
+class Fixtures:
+    """夹具存储：key → JSON 可序列化的响应"""
+
+    def __init__(self, path=None, latency=None, scale=1.0):
+        self.path = path
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.scale = scale
+        self.data = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except FileNotFoundError:
+                pass
+
+    def hit(self, provider, key, synth):
+        """回放：记一次调用、模拟延迟，返回夹具或合成数据"""
+        with self._lock:
+            self.calls[provider] = self.calls.get(provider, 0) + 1
+        time.sleep(self.latency.get(provider, 0) * self.scale)
+        if key in self.data:
+            return self.data[key]
+        return synth()
+
+    def record(self, key, value):
+        with self._lock:
+            self.data[key] = value
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def _seed(*parts):
+    return int(hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:8], 16)
+
+
+def synth_quote(ticker):
+    s = _seed("quote", ticker)
+    prev = 20 + s % 480
+    price = round(prev * (1 + ((s >> 8) % 600 - 300) / 10000), 2)
+    return {"c": price, "pc": prev, "d": round(price - prev, 2), "dp": round((price / prev - 1) * 100, 2)}
+
+
+def synth_trends(ticker):
+    s = _seed("trends", ticker)
+    return [{"buy": s % 20, "hold": (s >> 5) % 10, "sell": (s >> 9) % 5,
+             "strongBuy": (s >> 12) % 8, "strongSell": (s >> 15) % 3}]
+
+
+def synth_info(ticker):
+    q = synth_quote(ticker)
+    s = _seed("info", ticker)
+    sectors = ["Technology", "Financial Services", "Healthcare", "Consumer Cyclical", "Energy", "Industrials"]
+    return {
+        "shortName": ticker, "sector": sectors[s % len(sectors)],
+        "trailingPE": 8 + s % 50, "forwardPE": 7 + s % 40, "marketCap": (s % 3000) * 10 ** 9,
+        "targetMeanPrice": round(q["c"] * 1.1, 2), "targetHighPrice": round(q["c"] * 1.3, 2),
+        "targetLowPrice": round(q["c"] * 0.8, 2), "recommendationKey": "buy",
+        "fiftyTwoWeekHigh": round(q["c"] * 1.25, 2), "fiftyTwoWeekLow": round(q["c"] * 0.7, 2),
+        "beta": round(0.5 + (s % 150) / 100, 2),
+        "regularMarketPrice": q["c"], "currentPrice": q["c"], "previousClose": q["pc"],
+    }
+
+
+def synth_history(ticker, start):
+    """start 起到今天的合成日线（工作日），最后一天收盘价为 synth_quote 的当前价"""
+    days = pd.bdate_range(start=start, end=pd.Timestamp.today().normalize())
+    s = _seed("history", ticker)
+    steps = [((s >> (i % 24)) % 200 - 100) / 10000 for i in range(len(days))]
+    closes, price = [], synth_quote(ticker)["c"]
+    for step in reversed(steps):
+        closes.append(round(price, 2))
+        price /= 1 + step
+    closes.reverse()
+    return {
+        "date": [d.strftime("%Y-%m-%d") for d in days], "close": closes,
+        "high": [round(c * 1.01, 2) for c in closes], "low": [round(c * 0.99, 2) for c in closes],
+        "open": closes[:1] + closes[:-1], "volume": [1e6 + (s % 1000) * 1e3] * len(closes),
+    }
+
+
+def synth_analysis_text(prompt):
+    echoes = re.findall(r"### 新闻 \d+\n【股票代码】(\S+)\n【新闻标题】(.*)", prompt)
+    item = {"score": 6, "core": "基本面稳健，短期影响有限。", "logic": "业绩稳定 → 估值支撑 → 股价震荡",
+            "valuation": "估值接近行业均值。", "risk": "宏观需求放缓。", "action": "持有者观望，空仓者等待回调。"}
+    if echoes:
+        return json.dumps([dict(item, id=i, ticker=t, title=title) for i, (t, title) in enumerate(echoes)],
+                          ensure_ascii=False)
+    return "\n".join([
+        f"评分: {item['score']}", f"核心判断: {item['core']}", f"因果链: {item['logic']}",
+        f"估值视角: {item['valuation']}", f"风险提示: {item['risk']}", f"操作建议: {item['action']}",
+    ])
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 回放替身
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+class ReplayFinnhub:
+    def __init__(self, fixtures):
+        self.fx = fixtures
+
+    def quote(self, ticker):
+        return self.fx.hit("finnhub", f"finnhub.quote:{ticker}", lambda: synth_quote(ticker))
+
+    def recommendation_trends(self, ticker):
+        return self.fx.hit("finnhub", f"finnhub.trends:{ticker}", lambda: synth_trends(ticker))
+
+
+class ReplayYFinance:
+    """替代 yfinance 模块：只实现用到的 Ticker().info / history() 与 download()"""
+
+    def __init__(self, fixtures):
+        self.fx = fixtures
+
+    def Ticker(self, ticker):
+        fx = self.fx
+
+        class _Ticker:
+            @property
+            def info(self):
+                return fx.hit("yfinance_info", f"yfinance.info:{ticker}", lambda: synth_info(ticker))
+
+            def history(self, period="1mo", **kwargs):
+                closes = fx.hit(
+                    "yfinance_history", f"yfinance.history:{ticker}:{period}",
+                    lambda: [synth_quote(ticker)["pc"], synth_quote(ticker)["c"]],
+                )
+                index = pd.date_range(end=pd.Timestamp.today().normalize(), periods=len(closes))
+                return pd.DataFrame({"Close": closes}, index=index)
+
+        return _Ticker()
+
+    def download(self, tickers, start=None, **kwargs):
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        if start is not None:
+            return self._download_history(tickers, start)
+        closes = self.fx.hit(
+            "yfinance_download", "yfinance.download:" + ",".join(sorted(tickers)),
+            lambda: {t: [synth_quote(t)["pc"], synth_quote(t)["c"]] for t in tickers},
+        )
+        index = pd.date_range(end=pd.Timestamp.today().normalize(), periods=2)
+        frame = pd.DataFrame({("Close", t): closes.get(t, [None, None]) for t in tickers}, index=index)
+        frame.columns = pd.MultiIndex.from_tuples(frame.columns)
+        return frame
+
+    def _download_history(self, tickers, start):
+        """带 start 的 download：OHLCV 日线（price_store 补数据用）"""
+        history = self.fx.hit(
+            "yfinance_download", f"yfinance.download:{','.join(sorted(tickers))}:{start}",
+            lambda: {t: synth_history(t, start) for t in tickers},
+        )
+        index = pd.DatetimeIndex(sorted({d for h in history.values() for d in h["date"]}))
+        columns = {}
+        for field in ("Open", "High", "Low", "Close", "Volume"):
+            for t in tickers:
+                h = history.get(t)
+                series = pd.Series(h[field.lower()], index=pd.DatetimeIndex(h["date"])) if h else pd.Series(dtype=float)
+                columns[(field, t)] = series.reindex(index)
+        frame = pd.DataFrame(columns, index=index)
+        frame.columns = pd.MultiIndex.from_tuples(frame.columns)
+        return frame
+
+
+class ReplayGemini:
+    def __init__(self, fixtures):
+        fx = fixtures
+
+        class _Models:
+            def generate_content(self, model, contents, **kwargs):
+                key = "gemini:" + hashlib.sha1(contents.encode("utf-8")).hexdigest()
+                text = fx.hit("gemini", key, lambda: synth_analysis_text(contents))
+                return SimpleNamespace(text=text)
+
+        self.models = _Models()
+
+
+class ReplayResponse:
+    def __init__(self, status=200, body=b"", headers=None):
+        self.status_code = status
+        self.ok = status < 400
+        self.headers = headers or {}
+        self.content = body if isinstance(body, bytes) else body.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class ReplaySession:
+    """替代 http_pool.session()：按 host 判断 provider，RSS 返回 bench 生成的 feed"""
+
+    headers = {}
+
+    def __init__(self, fixtures, feeds=None):
+        self.fx = fixtures
+        self.feeds = feeds or {}
+
+    @staticmethod
+    def _provider(url):
+        host = urlsplit(url).hostname or ""
+        if "feishu" in host or "larksuite" in host:
+            return "lark"
+        if "stlouisfed" in host:
+            return "fred"
+        return "rss"
+
+    def _respond(self, method, url):
+        provider = self._provider(url)
+        key = f"http:{method} {url.split('?')[0]}"
+
+        def synth():
+            if provider == "lark":
+                if "tenant_access_token" in url:
+                    return {"status": 200, "body": json.dumps({"code": 0, "tenant_access_token": "t", "expire": 7200})}
+                return {"status": 200, "body": json.dumps({"code": 0})}
+            if provider == "fred":
+                return {"status": 200, "body": json.dumps({"observations": [{"value": "-5.6"}]})}
+            return {"status": 200, "body": self.feeds.get(url, "<rss><channel></channel></rss>")}
+
+        r = self.fx.hit(provider, key, synth)
+        return ReplayResponse(r["status"], r["body"], r.get("headers"))
+
+    def get(self, url, **kwargs):
+        return self._respond("GET", url)
+
+    def post(self, url, **kwargs):
+        return self._respond("POST", url)
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 录制
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+def _ohlcv(frame, tickers):
+    """download 的 DataFrame → {ticker: {"date", "open", "high", "low", "close", "volume"}}（去掉收盘价缺失的行）"""
+    history = {}
+    for t in tickers:
+        fields = {}
+        for field in ("Open", "High", "Low", "Close", "Volume"):
+            series = frame[field]
+            if isinstance(series, pd.DataFrame):
+                if t not in series.columns:
+                    break
+                series = series[t]
+            fields[field.lower()] = series
+        else:
+            rows = pd.DataFrame(fields).dropna(subset=["close"])
+            history[t] = {"date": [d.strftime("%Y-%m-%d") for d in rows.index],
+                          **{column: [float(v) for v in rows[column]] for column in rows.columns}}
+    return history
+
+
+class Recording:
+    """包装真实客户端，把每个响应按回放时的 key 写进夹具"""
+
+    def __init__(self, fixtures, fh_client, yf_module, gemini_client, session):
+        self.fx = fixtures
+        fx = fixtures
+
+        class _Finnhub:
+            def quote(self, ticker):
+                value = fh_client.quote(ticker)
+                fx.record(f"finnhub.quote:{ticker}", value)
+                return value
+
+            def recommendation_trends(self, ticker):
+                value = fh_client.recommendation_trends(ticker)
+                fx.record(f"finnhub.trends:{ticker}", value)
+                return value
+
+        class _YFinance:
+            def Ticker(self, ticker):
+                real = yf_module.Ticker(ticker)
+
+                class _Ticker:
+                    @property
+                    def info(self):
+                        value = real.info
+                        fx.record(f"yfinance.info:{ticker}", json.loads(json.dumps(value, default=str)))
+                        return value
+
+                    def history(self, period="1mo", **kwargs):
+                        frame = real.history(period=period, **kwargs)
+                        fx.record(f"yfinance.history:{ticker}:{period}", [float(v) for v in frame["Close"]])
+                        return frame
+
+                return _Ticker()
+
+            def download(self, tickers, start=None, **kwargs):
+                frame = yf_module.download(tickers, start=start, **kwargs)
+                names = [tickers] if isinstance(tickers, str) else list(tickers)
+                if start is not None:
+                    # 与 ReplayYFinance._download_history 相同的键和 OHLCV 结构
+                    fx.record(f"yfinance.download:{','.join(sorted(names))}:{start}", _ohlcv(frame, names))
+                    return frame
+                closes = frame["Close"].ffill().tail(2)
+                if isinstance(closes, pd.Series):
+                    closes = closes.to_frame(names[0])
+                fx.record("yfinance.download:" + ",".join(sorted(names)),
+                          {str(t): [float(v) for v in closes[t]] for t in closes.columns})
+                return frame
+
+        class _Models:
+            def generate_content(self, model, contents, **kwargs):
+                resp = gemini_client.models.generate_content(model=model, contents=contents, **kwargs)
+                fx.record("gemini:" + hashlib.sha1(contents.encode("utf-8")).hexdigest(), resp.text)
+                return resp
+
+        class _Session:
+            headers = session.headers
+
+            def _wrap(self, method, url, **kwargs):
+                resp = getattr(session, method.lower())(url, **kwargs)
+                keep = {k: v for k, v in resp.headers.items() if k in ("ETag", "Last-Modified")}
+                fx.record(f"http:{method} {url.split('?')[0]}",
+                          {"status": resp.status_code, "body": resp.content.decode("utf-8", "replace"), "headers": keep})
+                return resp
+
+            def get(self, url, **kwargs):
+                return self._wrap("GET", url, **kwargs)
+
+            def post(self, url, **kwargs):
+                return self._wrap("POST", url, **kwargs)
+
+        self.finnhub = _Finnhub()
+        self.yfinance = _YFinance()
+        self.gemini = SimpleNamespace(models=_Models())
+        self.session = _Session()
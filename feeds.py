@@ -0,0 +1,293 @@
+"""
+RSS 抓取引擎
+============
+- 多源：feeds.json 声明要抓的 feed，并发抓取
+- 条件请求：保存每个 feed 的 ETag / Last-Modified，未变化时服务端直接返回 304
+- 已读索引：SQLite 记录推送过的条目 GUID，只处理新条目
+- 跨源去重：标题字符 shingle + MinHash/LSH，近似重复的新闻只保留一条
+- 离线：设置 FEED_FIXTURE_DIR 后从 <dir>/<id>.xml 读取，不发网络请求
+
+状态文件位于 BLOOMBERG_CACHE_DIR/feeds.sqlite。
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import random
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import http_pool
+from local_cache import CACHE_DIR
+
+# 已读记录保留天数（RSS 里很少出现更老的条目）
+SEEN_RETENTION_DAYS = int(os.getenv("FEED_SEEN_RETENTION_DAYS", "30"))
+
+FEEDS_CONFIG = os.getenv("FEEDS_CONFIG") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "feeds.json")
+FIXTURE_DIR = os.getenv("FEED_FIXTURE_DIR")
+
+# 近似重复判定阈值（估计的 Jaccard 相似度）
+DUP_THRESHOLD = float(os.getenv("FEED_DUP_THRESHOLD", "0.6"))
+
+
+def entry_id(entry):
+    """条目唯一标识：优先 GUID，其次链接，最后标题"""
+    return entry.get("id") or entry.get("guid") or entry.get("link") or entry.get("title", "")
+
+
+class FeedState:
+    """feed 的条件请求头 + 已读 GUID 索引"""
+
+    def __init__(self, path=None):
+        """path 为 ":memory:" 时只在进程内保存（后端新闻刷新器用）"""
+        self.path = path or os.path.join(CACHE_DIR, "feeds.sqlite")
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                modified TEXT,
+                checked_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS seen (
+                guid TEXT PRIMARY KEY,
+                feed TEXT NOT NULL,
+                first_seen REAL NOT NULL
+            );
+        """)
+        self._db.commit()
+
+    def validators(self, url):
+        with self._lock:
+            row = self._db.execute("SELECT etag, modified FROM validators WHERE url = ?", (url,)).fetchone()
+        return row or (None, None)
+
+    def save_validators(self, url, etag, modified):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?)",
+                (url, etag, modified, time.time()),
+            )
+            self._db.commit()
+
+    def clear_validators(self, url):
+        """还有没处理完的新条目时调用，保证下次不会因 304 漏掉它们"""
+        with self._lock:
+            self._db.execute("DELETE FROM validators WHERE url = ?", (url,))
+            self._db.commit()
+
+    def unseen(self, entries):
+        """过滤出未处理过的条目（保持原顺序）"""
+        ids = [entry_id(e) for e in entries]
+        if not ids:
+            return []
+        with self._lock:
+            seen = {r[0] for r in self._db.execute(
+                f"SELECT guid FROM seen WHERE guid IN ({','.join('?' * len(ids))})", ids
+            )}
+        return [e for e, guid in zip(entries, ids) if guid not in seen]
+
+    def mark_seen(self, feed_url, entries):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO seen VALUES (?, ?, ?)",
+                [(entry_id(e), feed_url, now) for e in entries],
+            )
+            self._db.execute("DELETE FROM seen WHERE first_seen < ?", (now - SEEN_RETENTION_DAYS * 86400,))
+            self._db.commit()
+
+
+def _parse(data):
+    """feedparser 导入较慢，只在真正解析时加载"""
+    import feedparser
+    return feedparser.parse(data)
+
+
+def fetch(url, etag=None, modified=None, timeout=10):
+    """条件 GET 抓取 RSS
+
+    返回 (status, feed, etag, modified)。304 时 feed 为空解析结果；
+    网络错误时 status 为 None。
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if modified:
+        headers["If-Modified-Since"] = modified
+    try:
+        resp = http_pool.session().get(url, headers=headers, timeout=timeout)
+    except Exception as e:
+        print(f"⚠️ RSS 抓取失败 {url}: {e}")
+        return None, _parse(b""), etag, modified
+    if resp.status_code == 304:
+        return 304, _parse(b""), etag, modified
+    if not resp.ok:
+        print(f"⚠️ RSS 抓取失败 {url}: HTTP {resp.status_code}")
+        return resp.status_code, _parse(b""), etag, modified
+    return (
+        resp.status_code,
+        _parse(resp.content),
+        resp.headers.get("ETag"),
+        resp.headers.get("Last-Modified"),
+    )
+
+
+def fetch_fixture(feed_id):
+    """离线模式：从夹具目录读取保存好的 XML"""
+    path = os.path.join(FIXTURE_DIR, f"{feed_id}.xml")
+    if not os.path.exists(path):
+        return None, _parse(b""), None, None
+    with open(path, "rb") as f:
+        return 200, _parse(f.read()), None, None
+
+
+def load_feeds(path=None):
+    """读取 feed 配置，只返回启用的条目"""
+    with open(path or FEEDS_CONFIG, encoding="utf-8") as f:
+        config = json.load(f)
+    return [feed for feed in config["feeds"] if feed.get("enabled", True)]
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 跨源近似去重（MinHash + LSH）
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+_PRIME = (1 << 61) - 1
+_BANDS, _ROWS = 16, 4
+_rng = random.Random(20240101)  # 固定种子，保证签名跨进程稳定
+_HASH_PARAMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(_BANDS * _ROWS)]
+
+
+def _shingles(text, k=4):
+    norm = re.sub(r"[^a-z0-9 ]+", "", text.lower())
+    norm = re.sub(r"\s+", " ", norm).strip()
+    if len(norm) <= k:
+        return {zlib.crc32(norm.encode())}
+    return {zlib.crc32(norm[i:i + k].encode()) for i in range(len(norm) - k + 1)}
+
+
+def minhash(text):
+    """标题的 MinHash 签名"""
+    shingles = _shingles(text)
+    return tuple(min((a * x + b) % _PRIME for x in shingles) for a, b in _HASH_PARAMS)
+
+
+class MinHashIndex:
+    """LSH 分桶的 MinHash 索引：add() 时若已有近似条目则返回它的 key"""
+
+    def __init__(self, threshold=DUP_THRESHOLD):
+        self.threshold = threshold
+        self._sigs = {}
+        self._buckets = [{} for _ in range(_BANDS)]
+
+    def add(self, key, text):
+        sig = minhash(text)
+        candidates = set()
+        for band in range(_BANDS):
+            chunk = sig[band * _ROWS:(band + 1) * _ROWS]
+            candidates.update(self._buckets[band].get(chunk, ()))
+        for other in candidates:
+            other_sig = self._sigs[other]
+            similarity = sum(a == b for a, b in zip(sig, other_sig)) / len(sig)
+            if similarity >= self.threshold:
+                return other
+        self._sigs[key] = sig
+        for band in range(_BANDS):
+            chunk = sig[band * _ROWS:(band + 1) * _ROWS]
+            self._buckets[band].setdefault(chunk, []).append(key)
+        return None
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 多源抓取
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+class Ingest:
+    """一次抓取的结果
+
+    entries: 去重后待处理的新条目（各源轮流取，保持源内顺序），每条带 source 字段
+    duplicates: 被折叠掉的条目，key 为保留条目的 GUID
+    feeds: 每个源的抓取状态
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.duplicates = {}
+        self.feeds = []
+
+    @property
+    def unchanged(self):
+        """所有源都返回 304"""
+        return bool(self.feeds) and all(f["status"] == 304 for f in self.feeds)
+
+
+def ingest(feed_list, state=None, workers=8):
+    """并发抓取所有 feed → 过滤已读 → 跨源去重"""
+    def fetch_one(feed):
+        if FIXTURE_DIR:
+            return fetch_fixture(feed["id"])
+        etag, modified = state.validators(feed["url"]) if state else (None, None)
+        return fetch(feed["url"], etag, modified)
+
+    result = Ingest()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(feed_list)))) as pool:
+        fetched = list(pool.map(fetch_one, feed_list))
+
+    per_feed = []
+    for feed, (status, parsed, etag, modified) in zip(feed_list, fetched):
+        fresh = state.unseen(parsed.entries) if state else list(parsed.entries)
+        for entry in fresh:
+            entry["source"] = feed.get("source", feed["id"])
+            entry["feed_url"] = feed["url"]
+        result.feeds.append({
+            "id": feed["id"], "url": feed["url"], "status": status,
+            "etag": etag, "modified": modified,
+            "total": len(parsed.entries), "fresh": len(fresh),
+        })
+        per_feed.append(fresh)
+
+    # 各源轮流取一条，避免第一个源占满名额
+    index = MinHashIndex()
+    depth = max((len(f) for f in per_feed), default=0)
+    for rank in range(depth):
+        for fresh in per_feed:
+            if rank >= len(fresh):
+                continue
+            entry = fresh[rank]
+            guid = entry_id(entry)
+            original = index.add(guid, entry.get("title", ""))
+            if original is None:
+                result.entries.append(entry)
+            else:
+                result.duplicates.setdefault(original, []).append(entry)
+    return result
+
+
+def commit(state, result, delivered):
+    """记录已送达条目（连同它们的重复项），并更新各源的条件请求头"""
+    by_feed = {}
+    for entry in delivered:
+        for e in [entry, *result.duplicates.get(entry_id(entry), [])]:
+            by_feed.setdefault(e["feed_url"], []).append(e)
+    for url, entries in by_feed.items():
+        state.mark_seen(url, entries)
+
+    handled = {entry_id(e) for e in delivered}
+    leftovers = set()
+    for entry in result.entries:
+        guid = entry_id(entry)
+        if guid not in handled:
+            leftovers.update(e["feed_url"] for e in [entry, *result.duplicates.get(guid, [])])
+    for feed in result.feeds:
+        if feed["status"] == 200 and feed["url"] not in leftovers:
+            state.save_validators(feed["url"], feed["etag"], feed["modified"])
+        elif feed["status"] != 304:
+            state.clear_validators(feed["url"])
@@ -0,0 +1,83 @@
+"""
+共享 HTTP 连接池
+================
+push_telegram.py 和 backend/api_template.py 共用。
+
+所有出站 HTTP 调用走同一个 requests.Session：keep-alive 复用 TCP+TLS 连接，
+GET 请求在 502/503/504 时由 urllib3 自动重试（POST 不重试，避免重复发消息）。
+stats() 按 host 统计新建连接数与请求数，二者之差即复用次数。
+"""
+
+import os
+import threading
+
+import metrics
+
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+USER_AGENT = "MyPersonalBloomberg/7.0"
+
+_adapters = []
+_lock = threading.RLock()
+_session = None
+
+
+def _make_adapter():
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    with _lock:
+        _adapters.append(adapter)
+    return adapter
+
+
+def mount(sess):
+    """给已有 Session（如 finnhub.Client 内部的）挂上带统计的连接池"""
+    adapter = _make_adapter()
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+    return sess
+
+
+def session():
+    """进程内共享的 Session（首次调用时创建；requests 也在此时才导入）"""
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            _session = requests.Session()
+            _session.headers["User-Agent"] = USER_AGENT
+            mount(_session)
+        return _session
+
+
+def stats():
+    """按 host 汇总：新建连接数 / 请求数 / 复用次数"""
+    per_host = {}
+    with _lock:
+        adapters = list(_adapters)
+    for adapter in adapters:
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            s = per_host.setdefault(pool.host, {"connections": 0, "requests": 0})
+            s["connections"] += pool.num_connections
+            s["requests"] += pool.num_requests
+    for s in per_host.values():
+        s["reused"] = max(0, s["requests"] - s["connections"])
+    return per_host
+
+
+@metrics.register_collector
+def _metrics():
+    return [(f"http_pool_{key}", {"host": host}, value)
+            for host, s in stats().items() for key, value in s.items()]
@@ -0,0 +1,253 @@
+"""
+本地持久化缓存
+==============
+push_telegram.py 和 backend/api_template.py 共用。
+
+- FundamentalsCache: yfinance `.info` 字段级缓存（每个字段独立 TTL，按 ticker 做 LRU 淘汰）
+- AnalysisCache: AI 分析结果缓存，按内容哈希寻址（标题 + ticker + 数据快照 + prompt 版本）
+
+缓存目录由 BLOOMBERG_CACHE_DIR 指定，默认 ~/.cache/bloomberg。
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+import metrics
+
+CACHE_DIR = os.getenv("BLOOMBERG_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "bloomberg")
+
+# yfinance info 字段 → TTL（秒）。行业/名称几乎不变，估值随价格变动；
+# 价格（currentPrice 等）不进这个缓存，以实时报价 / 本地日线为准
+FIELD_TTLS = {
+    # 静态信息
+    "shortName": 7 * 86400,
+    "sector": 7 * 86400,
+    "beta": 86400,
+    # 分析师目标价（通常一天更新一次）
+    "targetMeanPrice": 86400,
+    "targetHighPrice": 86400,
+    "targetLowPrice": 86400,
+    "recommendationKey": 86400,
+    # 52 周区间
+    "fiftyTwoWeekHigh": 6 * 3600,
+    "fiftyTwoWeekLow": 6 * 3600,
+    # 随价格变动的估值
+    "trailingPE": 3600,
+    "forwardPE": 3600,
+    "marketCap": 3600,
+}
+
+
+class FundamentalsCache:
+    """yfinance 基本面缓存：SQLite 存储，字段级 TTL，按最近访问时间淘汰"""
+
+    def __init__(self, path=None, max_tickers=None):
+        self.path = path or os.path.join(CACHE_DIR, "fundamentals.sqlite")
+        self.max_tickers = max_tickers or int(os.getenv("FUNDAMENTALS_CACHE_MAX", "2000"))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS fields (
+                ticker TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT,
+                expires REAL NOT NULL,
+                PRIMARY KEY (ticker, field)
+            );
+            CREATE TABLE IF NOT EXISTS tickers (
+                ticker TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+        """)
+        self._db.commit()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0}
+
+    def get(self, ticker, fields=None):
+        """返回请求字段中仍未过期的缓存值（可能只有一部分）；请求字段全部有效才算命中"""
+        ticker = ticker.upper()
+        fields = list(fields or FIELD_TTLS)
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT field, value, expires FROM fields WHERE ticker = ? AND field IN ({','.join('?' * len(fields))})",
+                [ticker, *fields],
+            ).fetchall()
+            fresh = {field: value for field, value, expires in rows if expires > now}
+            if len(fresh) < len(fields):
+                if len(fresh) < len(rows):
+                    self._stats["stale"] += 1
+                self._stats["misses"] += 1
+            else:
+                self._stats["hits"] += 1
+            if fresh:
+                self._db.execute("UPDATE tickers SET last_access = ? WHERE ticker = ?", (now, ticker))
+                self._db.commit()
+        return {field: json.loads(value) for field, value in fresh.items()}
+
+    def put(self, ticker, info):
+        """写入一份 info（只保留 FIELD_TTLS 中的字段），必要时淘汰最久未用的 ticker"""
+        ticker = ticker.upper()
+        now = time.time()
+        rows = [(ticker, f, json.dumps(info.get(f)), now + ttl) for f, ttl in FIELD_TTLS.items()]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO fields VALUES (?, ?, ?, ?)", rows)
+            self._db.execute("INSERT OR REPLACE INTO tickers VALUES (?, ?)", (ticker, now))
+            self._evict()
+            self._db.commit()
+
+    def get_info(self, ticker, fetch, fields=None):
+        """先查缓存，只有请求字段缺失或过期时才调用 fetch() 取完整 info 并回写
+
+        返回请求字段的值（fields 为 None 时为 FIELD_TTLS 的全部字段）。
+        """
+        fields = list(fields or FIELD_TTLS)
+        cached = self.get(ticker, fields)
+        if len(cached) == len(fields):
+            return cached
+        info = fetch() or {}
+        if info:
+            self.put(ticker, info)
+        return dict(cached, **{f: info[f] for f in fields if f in info})
+
+    def _evict(self):
+        count = self._db.execute("SELECT COUNT(*) FROM tickers").fetchone()[0]
+        overflow = count - self.max_tickers
+        if overflow <= 0:
+            return
+        victims = [r[0] for r in self._db.execute(
+            "SELECT ticker FROM tickers ORDER BY last_access LIMIT ?", (overflow,)
+        )]
+        marks = ",".join("?" * len(victims))
+        self._db.execute(f"DELETE FROM fields WHERE ticker IN ({marks})", victims)
+        self._db.execute(f"DELETE FROM tickers WHERE ticker IN ({marks})", victims)
+        self._stats["evictions"] += len(victims)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self._db.execute("SELECT COUNT(*) FROM tickers").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def analysis_key(title, ticker, snapshot, prompt_version):
+    """AI 分析缓存键：输入内容的 SHA-256，任一部分变化即换键"""
+    payload = json.dumps(
+        [title.strip(), ticker.upper(), snapshot, prompt_version],
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """AI 分析结果缓存：内容寻址，整条 TTL，按最近访问时间淘汰"""
+
+    def __init__(self, path=None, max_entries=None, ttl=None):
+        self.path = path or os.path.join(CACHE_DIR, "analysis.sqlite")
+        self.max_entries = max_entries or int(os.getenv("ANALYSIS_CACHE_MAX", "5000"))
+        self.ttl = ttl or float(os.getenv("ANALYSIS_CACHE_TTL", str(24 * 3600)))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0}
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM analyses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM analyses WHERE key = ?", (key,))
+                self._db.commit()
+                self._stats["stale"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._db.execute("UPDATE analyses SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + self.ttl, now),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM analyses WHERE expires <= ?", (now,))
+        count = self._db.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM analyses WHERE key IN (SELECT key FROM analyses ORDER BY last_access LIMIT ?)",
+                (overflow,),
+            )
+            self._stats["evictions"] += overflow
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self._db.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+_fundamentals = None
+_analysis = None
+_singleton_lock = threading.Lock()
+
+
+def fundamentals_cache():
+    """进程内共享的 FundamentalsCache 单例"""
+    global _fundamentals
+    with _singleton_lock:
+        if _fundamentals is None:
+            _fundamentals = FundamentalsCache()
+        return _fundamentals
+
+
+def analysis_cache():
+    """进程内共享的 AnalysisCache 单例"""
+    global _analysis
+    with _singleton_lock:
+        if _analysis is None:
+            _analysis = AnalysisCache()
+        return _analysis
+
+
+@metrics.register_collector
+def _metrics():
+    """已创建的缓存的命中统计（不为导出指标而新建缓存文件）"""
+    samples = []
+    for name, cache in (("fundamentals", _fundamentals), ("analysis", _analysis)):
+        if cache is None:
+            continue
+        for key, value in cache.stats().items():
+            samples.append((f"cache_{key}", {"cache": name}, value))
+    return samples
@@ -0,0 +1,212 @@
+"""
+运行指标
+========
+push_telegram.py 和 backend/api_template.py 共用。
+
+- span(name, **labels): 上下文管理器 / 装饰器，记录耗时直方图，异常时计数
+- observe / inc / set_gauge: 直接写直方图、计数器、瞬时值
+- register_collector(fn): 导出时调用 fn() 取 [(name, labels, value)] 形式的瞬时值
+  （缓存命中率、限流统计等由各模块自己注册）
+- prometheus(): Prometheus 文本格式；write_jsonl(path): 每个序列一行 JSON
+
+所有序列名导出时加 METRICS_PREFIX 前缀（默认 bloomberg_）。
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import ContextDecorator
+
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "bloomberg_")
+
+# 秒；覆盖本地计算（毫秒级）到 Gemini 调用（十几秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """固定桶直方图（累计计数在导出时计算）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """按桶线性插值估计分位数"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    """线程安全的指标注册表：(name, labels) → 计数器 / 直方图 / 瞬时值"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._collectors = []
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(value)
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def register_collector(self, fn):
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._gauges.clear()
+
+    def _collect(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: (h.buckets, list(h.counts), h.count, h.sum, h.quantile(0.5), h.quantile(0.95))
+                          for k, h in self._histograms.items()}
+            gauges = dict(self._gauges)
+            collectors = list(self._collectors)
+        for fn in collectors:
+            try:
+                for name, labels, value in fn():
+                    gauges[self._key(name, labels)] = value
+            except Exception as e:
+                print(f"⚠️ 指标采集失败 {getattr(fn, '__name__', fn)}: {e}")
+        return counters, histograms, gauges
+
+    def snapshot(self):
+        """所有序列的 dict 列表（JSON lines 导出用）"""
+        counters, histograms, gauges = self._collect()
+        rows = []
+        for (name, labels), value in sorted(counters.items()):
+            rows.append({"name": name, "type": "counter", "labels": dict(labels), "value": value})
+        for (name, labels), (_, _, count, total, p50, p95) in sorted(histograms.items()):
+            rows.append({"name": name, "type": "histogram", "labels": dict(labels), "count": count,
+                         "sum": round(total, 6), "p50": round(p50, 6), "p95": round(p95, 6)})
+        for (name, labels), value in sorted(gauges.items()):
+            rows.append({"name": name, "type": "gauge", "labels": dict(labels), "value": value})
+        return rows
+
+    def prometheus(self):
+        """Prometheus 文本格式（exposition format 0.0.4）"""
+        counters, histograms, gauges = self._collect()
+        lines = []
+
+        def fmt(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        def section(kind, series):
+            last = None
+            for (name, labels), value in sorted(series.items()):
+                full = METRICS_PREFIX + name
+                if full != last:
+                    lines.append(f"# TYPE {full} {kind}")
+                    last = full
+                yield full, labels, value
+
+        for full, labels, value in section("counter", counters):
+            lines.append(f"{full}{fmt(labels)} {value}")
+        for full, labels, (buckets, counts, count, total, _, _) in section("histogram", histograms):
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f"{full}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{full}_bucket{fmt(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{full}_sum{fmt(labels)} {total:.6f}")
+            lines.append(f"{full}_count{fmt(labels)} {count}")
+        for full, labels, value in section("gauge", gauges):
+            lines.append(f"{full}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_jsonl(self, path, **extra):
+        """把当前快照追加到 JSON lines 文件，每个序列一行（extra 字段附加到每行）"""
+        ts = time.time()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for row in self.snapshot():
+                f.write(json.dumps(dict(row, ts=ts, **extra), ensure_ascii=False) + "\n")
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+set_gauge = registry.set_gauge
+register_collector = registry.register_collector
+prometheus = registry.prometheus
+snapshot = registry.snapshot
+write_jsonl = registry.write_jsonl
+
+
+class span(ContextDecorator):
+    """计时区段：{name}_seconds 直方图；抛异常时 {name}_errors_total 按异常类型计数
+
+        with metrics.span("upstream", provider="finnhub"):
+            ...
+
+        @metrics.span("card_build")
+        def build_card(...): ...
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self._local = threading.local()
+
+    def __enter__(self):
+        stack = getattr(self._local, "starts", None)
+        if stack is None:
+            stack = self._local.starts = []
+        stack.append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._local.starts.pop()
+        observe(f"{self.name}_seconds", elapsed, **self.labels)
+        if exc_type is not None:
+            inc(f"{self.name}_errors_total", error=exc_type.__name__, **self.labels)
+        return False
+
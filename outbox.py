@@ -0,0 +1,257 @@
+"""
+卡片发送队列
+============
+push_telegram.py 使用。
+
+- Outbox: SQLite 持久化的待发队列。流水线只负责入队，没发出去的卡片留在库里，下次运行继续投递
+- 同一张卡片发往多个 chat 时只序列化一次，每个 chat 一条消息记录
+- Sender: 后台线程并发投递，不同 chat 并行，同一 chat 严格按入队顺序（前一条没成功，后面的不越过）；
+  按 chat 统计送达、失败和耗时
+- 失败按指数退避重试；deliver 抛出 retryable=False 的异常或超过 OUTBOX_MAX_ATTEMPTS 次后标记为 dead
+- 整体 QPS 由 ratelimit 的令牌桶控制（provider 由调用方指定）；单次投递不在 ratelimit 里重试，
+  重试只由队列的退避负责
+
+队列文件默认为 BLOOMBERG_CACHE_DIR 下的 outbox.sqlite。
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import ratelimit
+from local_cache import CACHE_DIR
+
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "2"))   # 秒
+BACKOFF_CAP = float(os.getenv("OUTBOX_BACKOFF_CAP", "300"))   # 秒
+# 已发送记录保留时长，之后清理
+SENT_RETENTION = float(os.getenv("OUTBOX_SENT_RETENTION", str(7 * 86400)))
+
+Message = namedtuple("Message", ["id", "chat_id", "content", "label", "attempts"])
+
+
+class Outbox:
+    """SQLite 待发队列：status 为 pending / sent / dead"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, "outbox.sqlite")
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT NOT NULL,
+                content TEXT NOT NULL,
+                label TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created REAL NOT NULL,
+                sent_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS messages_pending ON messages (status, chat_id, id);
+        """)
+        self._db.commit()
+
+    def enqueue(self, chat_ids, card, label=None):
+        """把一张卡片（dict 或已序列化的 JSON 字符串）入队发往一个或多个 chat
+
+        卡片只序列化一次；返回入队的消息条数。
+        """
+        if isinstance(chat_ids, str):
+            chat_ids = [chat_ids]
+        content = card if isinstance(card, str) else json.dumps(card, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO messages (chat_id, content, label, created) VALUES (?, ?, ?, ?)",
+                [(chat_id, content, label, now) for chat_id in chat_ids],
+            )
+            self._db.commit()
+        return len(chat_ids)
+
+    def heads(self):
+        """每个 chat 最早的一条 pending 消息：[(Message, next_attempt)]，按 id 排序"""
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT m.id, m.chat_id, m.content, m.label, m.attempts, m.next_attempt
+                FROM messages m
+                JOIN (SELECT MIN(id) AS head FROM messages WHERE status = 'pending' GROUP BY chat_id) h
+                  ON m.id = h.head
+                ORDER BY m.id
+            """).fetchall()
+        return [(Message(*row[:5]), row[5]) for row in rows]
+
+    def mark_sent(self, msg_id):
+        with self._lock:
+            self._db.execute(
+                "UPDATE messages SET status = 'sent', attempts = attempts + 1, sent_at = ? WHERE id = ?",
+                (time.time(), msg_id),
+            )
+            self._db.commit()
+
+    def mark_failed(self, msg, error, retryable=True):
+        """记录一次失败：可重试则按退避推迟，否则（或次数用尽）标记为 dead；返回新状态"""
+        attempts = msg.attempts + 1
+        status = "pending" if retryable and attempts < MAX_ATTEMPTS else "dead"
+        delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+        with self._lock:
+            self._db.execute(
+                "UPDATE messages SET status = ?, attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                (status, attempts, time.time() + delay, str(error)[:500], msg.id),
+            )
+            self._db.commit()
+        return status
+
+    def purge(self, retention=SENT_RETENTION):
+        """清理过期的已发送记录"""
+        with self._lock:
+            self._db.execute("DELETE FROM messages WHERE status = 'sent' AND sent_at < ?",
+                             (time.time() - retention,))
+            self._db.commit()
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM messages GROUP BY status").fetchall()
+        return dict({"pending": 0, "sent": 0, "dead": 0}, **dict(rows))
+
+
+class Sender:
+    """后台投递：调度线程挑出各 chat 的队首消息，交给线程池并发发送
+
+    deliver(chat_id, content) 失败时抛异常；异常带 retryable=False 表示不必重试。
+    """
+
+    def __init__(self, outbox, deliver, provider="lark", workers=4):
+        self.outbox = outbox
+        self.deliver = deliver
+        self.provider = provider
+        self.workers = max(1, workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="outbox")
+        self._cond = threading.Condition()
+        self._busy = set()  # 有消息在途的 chat
+        self._closing = False
+        self._deadline = None
+        self._thread = None
+        self.stats = {"sent": 0, "failed": 0, "dead": 0}
+        # chat → {"sent", "failed", "dead", "seconds", "worst", "error"}
+        self.destinations = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="outbox-dispatch", daemon=True)
+        self._thread.start()
+        return self
+
+    def notify(self):
+        """有新消息入队时唤醒调度线程"""
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._thread is None or not self._thread.is_alive()
+
+    def close(self, timeout=60):
+        """不再等待新消息：投递完当前能发的（最多等 timeout 秒）后停止
+
+        返回本次的 sent / failed / dead 次数和队列里剩余的 pending 条数。
+
+        到期时不再发出新消息（已在途的等它完成）；没来得及发的和退避时间超过期限的消息
+        留在队列里，下次运行继续。
+        """
+        if self._thread is not None:
+            with self._cond:
+                self._closing = True
+                self._deadline = time.monotonic() + timeout
+                self._cond.notify_all()
+            self._thread.join()
+            self._pool.shutdown(wait=True)
+        return dict(self.stats, pending=self.outbox.counts()["pending"])
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if self._closing and time.monotonic() >= self._deadline:
+                    return
+                now = time.time()
+                ready, next_due = [], None
+                for msg, due in self.outbox.heads():
+                    if msg.chat_id in self._busy:
+                        continue
+                    if due <= now:
+                        ready.append(msg)
+                    else:
+                        next_due = due if next_due is None else min(next_due, due)
+                ready = ready[:self.workers - len(self._busy)]
+                for msg in ready:
+                    self._busy.add(msg.chat_id)
+
+                if not ready:
+                    if self._closing and not self._busy:
+                        # 没有在途消息，且剩下的都要退避到期限之后：留给下次运行
+                        remaining = self._deadline - time.monotonic()
+                        if next_due is None or next_due - now >= remaining:
+                            return
+                    wait = 1.0 if next_due is None else min(1.0, max(0.01, next_due - now))
+                    self._cond.wait(wait)
+                    continue
+
+            for msg in ready:
+                self._pool.submit(self._send, msg)
+
+    def _send(self, msg):
+        error = None
+        start = time.perf_counter()
+        try:
+            with metrics.span("outbox_send", provider=self.provider, chat=msg.chat_id):
+                ratelimit.call_once(self.provider, self.deliver, msg.chat_id, msg.content)
+            self.outbox.mark_sent(msg.id)
+            result = "sent"
+        except Exception as e:
+            error = str(e)
+            status = self.outbox.mark_failed(msg, e, getattr(e, "retryable", True))
+            result = "dead" if status == "dead" else "failed"
+            print(f"   ⚠️ 卡片投递失败 [{msg.label or msg.id}] → {msg.chat_id}（第 {msg.attempts + 1} 次）: {e}")
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self.stats[result] += 1
+            dest = self.destinations.setdefault(
+                msg.chat_id, {"sent": 0, "failed": 0, "dead": 0, "seconds": 0.0, "worst": 0.0, "error": None})
+            dest[result] += 1
+            dest["seconds"] += elapsed
+            dest["worst"] = max(dest["worst"], elapsed)
+            if error:
+                dest["error"] = error
+            self._busy.discard(msg.chat_id)
+            self._cond.notify_all()
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def default_outbox():
+    """进程内共享的 Outbox 单例"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+        return _outbox
+
+
+@metrics.register_collector
+def _metrics():
+    if _outbox is None:
+        return []
+    return [("outbox_messages", {"status": status}, n) for status, n in _outbox.counts().items()]
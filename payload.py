@@ -0,0 +1,130 @@
+"""
+响应编码
+========
+backend/api_template.py 使用。
+
+- Payload 包装一份可 JSON 序列化的响应数据，各种表示（JSON / msgpack × identity / gzip / br）
+  第一次用到时编码并留在对象上；放进响应缓存后，同一缓存版本的后续请求不再重复序列化和压缩
+- ETag 由 JSON 内容的摘要加表示后缀组成（强校验）；内容没变时即使缓存刷新过 ETag 也不变
+- negotiate(accept, accept_encoding): 按请求头选格式和压缩；msgpack 需客户端显式 Accept，
+  msgpack / brotli 未安装时自动退回 JSON / gzip
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 小于该字节数的响应不压缩（压缩头开销抵消收益）
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+}
+# 客户端可能使用的 msgpack 媒体类型
+MSGPACK_ACCEPT = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def _json(data):
+    # 与 FastAPI 的 JSONResponse 输出一致
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+ENCODERS = {"json": _json}
+if msgpack is not None:
+    ENCODERS["msgpack"] = lambda data: msgpack.packb(data, use_bin_type=True)
+
+COMPRESSORS = {"gzip": lambda body: gzip.compress(body, GZIP_LEVEL, mtime=0)}
+if brotli is not None:
+    COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+
+
+def _tokens(header):
+    """解析 Accept / Accept-Encoding：返回 q > 0 的取值集合（小写，忽略参数）"""
+    accepted = set()
+    for part in (header or "").split(","):
+        value, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if value and q > 0:
+            accepted.add(value.lower())
+    return accepted
+
+
+def negotiate(accept=None, accept_encoding=None):
+    """按请求头选 (格式, 压缩)；压缩为 None 表示不压缩"""
+    fmt = "msgpack" if "msgpack" in ENCODERS and _tokens(accept) & set(MSGPACK_ACCEPT) else "json"
+    encodings = _tokens(accept_encoding)
+    coding = next((c for c in ("br", "gzip") if c in COMPRESSORS and c in encodings), None)
+    return fmt, coding
+
+
+class Payload:
+    """一份响应数据及其按需生成、可复用的各种编码"""
+
+    def __init__(self, data):
+        self.data = data  # 已转换为 JSON 兼容类型（dict / list / str / 数字）
+        self._bodies = {}
+        self._digest = None
+        self._lock = threading.Lock()
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = hashlib.sha1(self.body("json")).hexdigest()[:20]
+        return self._digest
+
+    def etag(self, fmt="json", coding=None):
+        suffix = fmt if coding is None else f"{fmt}-{coding}"
+        return f'"{self.digest}-{suffix}"'
+
+    def body(self, fmt="json", coding=None):
+        """编码后的字节；结果留在对象上，同一 Payload 不会重复编码"""
+        key = (fmt, coding)
+        body = self._bodies.get(key)
+        if body is None:
+            if coding is None:
+                body = ENCODERS[fmt](self.data)
+            else:
+                body = COMPRESSORS[coding](self.body(fmt))
+            with self._lock:
+                body = self._bodies.setdefault(key, body)
+        return body
+
+    def render(self, accept=None, accept_encoding=None, if_none_match=None):
+        """返回 (status, body, headers)；If-None-Match 命中时 status 为 304、body 为空"""
+        fmt, coding = negotiate(accept, accept_encoding)
+        if coding is not None and len(self.body(fmt)) < COMPRESS_MIN_BYTES:
+            coding = None
+        etag = self.etag(fmt, coding)
+        headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding"}
+        if if_none_match and (if_none_match.strip() == "*" or etag in _etags(if_none_match)):
+            return 304, b"", headers
+        headers["Content-Type"] = MEDIA_TYPES[fmt]
+        if coding is not None:
+            headers["Content-Encoding"] = coding
+        return 200, self.body(fmt, coding), headers
+
+
+def _etags(header):
+    # If-None-Match 比较使用弱比较：忽略 W/ 前缀
+    return {tag.strip().removeprefix("W/") for tag in header.split(",")}
@@ -0,0 +1,261 @@
+"""
+本地日线行情库
+==============
+push_telegram.py 和 backend/api_template.py 共用。
+
+- 每个 ticker 一个目录，每个字段（date / open / high / low / close / volume）一个定长二进制列文件
+- 读取用 numpy.memmap，切片不拷贝；52 周高低点等价格指标在本地计算（微秒级）
+- refresh 只向上游拉取最后一条之后缺失的交易日，追加写入列文件；只保存已收盘的交易日，
+  当天价格以实时报价为准
+- 追加写到一半中断导致各列长度不一致时，按最短列截齐
+- 每个 ticker 另记一个「已核对到」的日期（文件 + 进程内缓存）：节假日等没有新数据的交易日、
+  上游没有数据的代码，拉取为空时也算已是最新，同一交易日内不再重复下载
+- 读取视图按文件长度校验，其他进程追加的新行下次读取即可见；打开的视图按 LRU 限量（PRICE_VIEWS_MAX）
+
+目录为 BLOOMBERG_CACHE_DIR 下的 prices/。
+"""
+
+import os
+import datetime
+import threading
+from collections import OrderedDict
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+import metrics
+from local_cache import CACHE_DIR
+
+COLUMNS = {
+    "date": np.dtype("<M8[D]"),
+    "open": np.dtype("<f8"),
+    "high": np.dtype("<f8"),
+    "low": np.dtype("<f8"),
+    "close": np.dtype("<f8"),
+    "volume": np.dtype("<f8"),
+}
+# 列名 → yfinance 返回的字段名
+YF_FIELDS = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+# 新 ticker 首次拉取的历史长度（天），覆盖 52 周
+INITIAL_DAYS = int(os.getenv("PRICE_HISTORY_DAYS", "400"))
+# 同时保持打开的 ticker 视图数（每个占 6 个 memmap 文件句柄），超出按最近使用淘汰
+MAX_VIEWS = int(os.getenv("PRICE_VIEWS_MAX", "256"))
+MARKET_TZ = ZoneInfo("America/New_York")
+
+
+def market_today():
+    """美东当天日期"""
+    return datetime.datetime.now(MARKET_TZ).date()
+
+
+def last_session(today=None):
+    """最近一个已收盘的交易日（按美东日期取前一个工作日，不考虑节假日）"""
+    today = today or market_today()
+    return np.busday_offset(np.datetime64(today, "D"), -1, roll="forward")
+
+
+class PriceStore:
+    """按 ticker 分目录、按字段分列文件的日线库"""
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(CACHE_DIR, "prices")
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._views = OrderedDict()  # ticker → {列名: memmap 切片}，文件长度变化后重建，LRU
+        self._checked = {}  # ticker → 已核对到的交易日
+        self._stats = {"reads": 0, "refreshes": 0, "fetched": 0, "appended": 0, "up_to_date": 0}
+
+    def _path(self, ticker, column):
+        return os.path.join(self.root, ticker.upper(), f"{column}.bin")
+
+    def _checked_path(self, ticker):
+        return os.path.join(self.root, ticker.upper(), "checked")
+
+    def _length(self, ticker):
+        sizes = []
+        for column, dtype in COLUMNS.items():
+            try:
+                sizes.append(os.path.getsize(self._path(ticker, column)) // dtype.itemsize)
+            except FileNotFoundError:
+                return 0
+        return min(sizes)
+
+    def columns(self, ticker):
+        """全部历史：{列名: 只读数组}，按日期升序；数组是 memmap 视图，切片不拷贝"""
+        ticker = ticker.upper()
+        n = self._length(ticker)
+        with self._lock:
+            views = self._views.get(ticker)
+            if views is None or len(views["date"]) != n:
+                views = {
+                    column: (np.memmap(self._path(ticker, column), dtype=dtype, mode="r", shape=(n,))
+                             if n else np.empty(0, dtype=dtype))
+                    for column, dtype in COLUMNS.items()
+                }
+                self._views[ticker] = views
+            self._views.move_to_end(ticker)
+            while len(self._views) > MAX_VIEWS:
+                self._views.popitem(last=False)
+        self._stats["reads"] += 1
+        return views
+
+    def last_date(self, ticker):
+        dates = self.columns(ticker)["date"]
+        return dates[-1] if len(dates) else None
+
+    def checked_date(self, ticker):
+        """最近一次成功向上游核对时的目标交易日；没有记录时返回 None"""
+        ticker = ticker.upper()
+        checked = self._checked.get(ticker)
+        if checked is None:
+            try:
+                with open(self._checked_path(ticker)) as f:
+                    checked = self._checked[ticker] = np.datetime64(f.read().strip(), "D")
+            except (FileNotFoundError, ValueError):
+                return None
+        return checked
+
+    def mark_checked(self, ticker, day):
+        path = self._checked_path(ticker)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            f.write(str(day))
+        os.replace(path + ".tmp", path)
+        self._checked[ticker.upper()] = np.datetime64(day, "D")
+
+    def window(self, ticker, days=365, end=None):
+        """最近 days 天（截至 end，默认美东今天）的各列切片"""
+        cols = self.columns(ticker)
+        end = np.datetime64(end or market_today(), "D")
+        dates = cols["date"]
+        lo = np.searchsorted(dates, end - np.timedelta64(days, "D"), side="right")
+        hi = np.searchsorted(dates, end, side="right")
+        return {column: values[lo:hi] for column, values in cols.items()}
+
+    def week52(self, ticker, price=None):
+        """52 周高低点、当前价格及其所处位置（0~100）；没有本地历史时返回 None
+
+        price 为实时价格（计入区间），默认取最后一个收盘价。
+        """
+        w = self.window(ticker, 365)
+        if not len(w["date"]):
+            return None
+        high = float(np.nanmax(w["high"]))
+        low = float(np.nanmin(w["low"]))
+        if price is None:
+            price = float(w["close"][-1])
+        high, low = max(high, price), min(low, price)
+        position = round((price - low) / (high - low) * 100, 1) if high > low else None
+        return {"high": round(high, 2), "low": round(low, 2), "price": round(price, 2), "position": position}
+
+    def append(self, ticker, rows):
+        """追加 rows（{列名: 数组}，按日期升序）中比已有最后一天更新的部分，返回追加条数"""
+        ticker = ticker.upper()
+        dates = np.asarray(rows["date"], dtype=COLUMNS["date"])
+        with self._lock:
+            n = self._length(ticker)
+            os.makedirs(os.path.dirname(self._path(ticker, "date")), exist_ok=True)
+            last = None
+            if n:
+                last = np.fromfile(self._path(ticker, "date"), dtype=COLUMNS["date"],
+                                   count=1, offset=(n - 1) * COLUMNS["date"].itemsize)[0]
+            keep = dates > last if last is not None else np.ones(len(dates), dtype=bool)
+            if not keep.any():
+                return 0
+            for column, dtype in COLUMNS.items():
+                path = self._path(ticker, column)
+                with open(path, "ab") as f:
+                    # 上次追加中断留下的多余尾部先截掉
+                    f.truncate(n * dtype.itemsize)
+                    f.write(np.asarray(rows[column], dtype=dtype)[keep].tobytes())
+            self._views.pop(ticker, None)
+            appended = int(keep.sum())
+            self._stats["appended"] += appended
+            return appended
+
+    def stale(self, tickers, today=None):
+        """需要补数据的 ticker → 起始日期（本地最后一天的次日；没有历史时往前 INITIAL_DAYS 天）"""
+        target = last_session(today)
+        starts = {}
+        for ticker in tickers:
+            # 已核对到 target 但没有新行（节假日 / 上游没有这个代码）也算最新；
+            # 起始日期仍按本地最后一天，漏掉的行下一个交易日补上
+            checked = self.checked_date(ticker)
+            if checked is not None and checked >= target:
+                self._stats["up_to_date"] += 1
+                continue
+            last = self.last_date(ticker)
+            if last is not None and last >= target:
+                self._stats["up_to_date"] += 1
+                continue
+            starts[ticker.upper()] = (last + 1) if last is not None else target - INITIAL_DAYS
+        return starts
+
+    def refresh(self, tickers, download, today=None):
+        """补齐 tickers 缺失的已收盘交易日，返回 {ticker: 追加条数}
+
+        download(tickers, start) 返回 yfinance.download(group_by="column") 形式的 DataFrame；
+        所有需要补的 ticker 合并成一次请求，起始日期取最早的那个。
+        拉取成功后每个 ticker 都记为已核对到最近交易日，即使没有新行（节假日、未知代码）。
+        """
+        starts = self.stale(tickers, today)
+        if not starts:
+            return {}
+        self._stats["refreshes"] += 1
+        target = last_session(today)
+        frame = download(list(starts), str(min(starts.values())))
+        self._stats["fetched"] += len(starts)
+        appended = {}
+        for ticker, rows in from_download(frame, list(starts)).items():
+            closed = rows["date"] <= target
+            appended[ticker] = self.append(ticker, {column: values[closed] for column, values in rows.items()})
+        for ticker in starts:
+            self.mark_checked(ticker, target)
+        return appended
+
+    def stats(self):
+        return dict(self._stats, tickers=len(os.listdir(self.root)))
+
+
+def from_download(frame, tickers):
+    """yfinance.download / Ticker.history 的 DataFrame → {ticker: {列名: 数组}}（去掉收盘价缺失的行）"""
+    if frame is None or not len(frame):
+        return {}
+    dates = np.asarray(frame.index.values).astype(COLUMNS["date"])
+    result = {}
+    for ticker in tickers:
+        rows = {"date": dates}
+        for column, field in YF_FIELDS.items():
+            if field not in frame:
+                break
+            series = frame[field]
+            if hasattr(series, "columns"):
+                if ticker not in series.columns:
+                    break
+                series = series[ticker]
+            rows[column] = series.to_numpy(dtype="f8", na_value=np.nan)
+        else:
+            keep = ~np.isnan(rows["close"])
+            result[ticker.upper()] = {column: values[keep] for column, values in rows.items()}
+    return result
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def price_store():
+    """进程内共享的 PriceStore 单例"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PriceStore()
+        return _store
+
+
+@metrics.register_collector
+def _metrics():
+    if _store is None:
+        return []
+    return [(f"price_store_{key}", {}, value) for key, value in _store.stats().items()]
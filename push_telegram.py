@@ -11,15 +11,22 @@ Bloomberg V7.0 Pro - 专业级金融终端
 """
 
 import os
+import time
 import datetime
-import requests
+import threading
+import functools
 import json
 import re
-import feedparser
-import finnhub
-import yfinance as yf
-from google import genai
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
 from zoneinfo import ZoneInfo
+from local_cache import fundamentals_cache, analysis_cache, analysis_key
+import ratelimit
+import http_pool
+import metrics
+import feeds
+import outbox
+import ticker_matcher
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 # 1. 配置初始化
@@ -28,22 +35,99 @@ from zoneinfo import ZoneInfo
 cfg = {
     "lark_id": os.getenv("LARK_APP_ID"),
     "lark_secret": os.getenv("LARK_APP_SECRET"),
-    "chat_id": os.getenv("LARK_CHAT_ID"),
+    # 接收卡片的群；逗号分隔可同时发往多个群
+    "chat_ids": [c.strip() for c in os.getenv("LARK_CHAT_ID", "").split(",") if c.strip()],
     "finnhub_key": os.getenv("FINNHUB_KEY"),
     "gemini_key": os.getenv("GEMINI_KEY"),
     "fred_key": os.getenv("FRED_KEY"),
     "alpha_key": os.getenv("ALPHA_VANTAGE_KEY"),
+    # 并发度：每条新闻一个 worker，设为 1 即退回串行模式
+    "workers": int(os.getenv("PIPELINE_WORKERS", "4")),
+    "news_limit": int(os.getenv("NEWS_LIMIT", "4")),
+    # 批量 AI 分析：所有新闻合并成一次 Gemini 请求（AI_BATCH=0 退回逐条）
+    "ai_batch": os.getenv("AI_BATCH", "1") != "0",
+    # 增量抓取：条件请求 + 已读索引（FEED_INCREMENTAL=0 每次全量处理）
+    "incremental": os.getenv("FEED_INCREMENTAL", "1") != "0",
+    # 运行结束时把指标快照追加到该 JSON lines 文件（不设置则不导出）
+    "metrics_jsonl": os.getenv("METRICS_JSONL"),
+    # 运行结束时最多再等多久把发送队列投递完（秒），剩下的留到下次运行
+    "outbox_drain": float(os.getenv("OUTBOX_DRAIN_SECONDS", "120")),
 }
 
-required = ["lark_id", "lark_secret", "chat_id", "finnhub_key", "gemini_key"]
-missing = [k for k in required if not cfg.get(k)]
-if missing:
-    raise ValueError(f"❌ 缺少必需环境变量: {missing}")
+REQUIRED_CONFIG = ["lark_id", "lark_secret", "chat_ids", "finnhub_key", "gemini_key"]
 
-fh_client = finnhub.Client(api_key=cfg["finnhub_key"])
-gemini_client = genai.Client(api_key=cfg["gemini_key"])
 
-# 公司名 → Ticker 映射
+def check_config(keys=None):
+    """校验必需的环境变量（run() 和首次创建客户端时调用，导入模块本身不需要凭证）
+
+    keys 默认为 REQUIRED_CONFIG；各客户端只校验自己用到的那几项。
+    """
+    missing = [k for k in (keys or REQUIRED_CONFIG) if not cfg.get(k)]
+    if missing:
+        raise ValueError(f"❌ 缺少必需环境变量: {missing}")
+
+
+# 客户端与重量级依赖（finnhub / yfinance / google-genai）在首次使用时才创建，
+# 这样只用卡片构建、ticker 识别等纯函数时导入只需几毫秒
+_clients = {}
+_clients_lock = threading.RLock()
+
+
+def _client(name, build):
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = build()
+        return _clients[name]
+
+
+def set_client(name, client):
+    """替换某个客户端（finnhub / gemini / yfinance / lark），供基准回放等场景注入"""
+    with _clients_lock:
+        _clients[name] = client
+
+
+def finnhub_client():
+    def build():
+        import finnhub
+        check_config(["finnhub_key"])
+        client = finnhub.Client(api_key=cfg["finnhub_key"])
+        http_pool.mount(client._session)  # finnhub 自带 Session，换上共享的连接池配置
+        return client
+    return _client("finnhub", build)
+
+
+def gemini_client():
+    def build():
+        from google import genai
+        check_config(["gemini_key"])
+        return genai.Client(api_key=cfg["gemini_key"])
+    return _client("gemini", build)
+
+
+def yfinance():
+    """yfinance 模块（连带 pandas，导入约需 1 秒）"""
+    def build():
+        import yfinance
+        return yfinance
+    return _client("yfinance", build)
+
+
+def price_history():
+    """本地日线库（price_store，连带 numpy）"""
+    def build():
+        import price_store
+        return price_store.price_store()
+    return _client("prices", build)
+
+
+def lark_client():
+    def build():
+        check_config(["lark_id", "lark_secret", "chat_ids"])
+        return LarkClient()
+    return _client("lark", build)
+
+
+# 公司名 → Ticker 映射（内置别名，data/symbols.csv 可扩展）
 COMPANY_MAP = {
     "nvidia": "NVDA", "apple": "AAPL", "microsoft": "MSFT", "google": "GOOGL",
     "alphabet": "GOOGL", "amazon": "AMZN", "meta": "META", "facebook": "META",
@@ -63,6 +147,13 @@ EXCLUDE_TICKERS = {
     'DEI', 'ESG', 'ETF', 'NYSE', 'NASA', 'FBI', 'CIA', 'NFL', 'NBA', 'WHO',
 }
 
+# 市场概览指数
+MARKET_INDICES = [
+    ("SPY", "S&P500"),
+    ("QQQ", "纳指100"),
+    ("DIA", "道指"),
+]
+
 # 行业平均 P/E（简化版）
 SECTOR_PE = {
     "Technology": 30, "Financial Services": 15, "Healthcare": 22,
@@ -71,75 +162,339 @@ SECTOR_PE = {
     "default": 20
 }
 
+# 每个上游同时在途的请求上限（免费额度都比较紧）
+UPSTREAM_LIMITS = {
+    "finnhub": int(os.getenv("FINNHUB_CONCURRENCY", "4")),
+    "yfinance": int(os.getenv("YFINANCE_CONCURRENCY", "2")),
+    "gemini": int(os.getenv("GEMINI_CONCURRENCY", "2")),
+    "lark": int(os.getenv("LARK_CONCURRENCY", "8")),
+    "fred": 1,
+}
+
+# get_comprehensive_data 中各数据源的等待上限（秒，从提交时刻起算），超时按缺失处理
+FETCH_TIMEOUTS = {
+    "quote": float(os.getenv("QUOTE_TIMEOUT", "5")),
+    "fundamentals": float(os.getenv("FUNDAMENTALS_TIMEOUT", "15")),
+    "analyst": float(os.getenv("ANALYST_TIMEOUT", "5")),
+    "prices": float(os.getenv("PRICES_TIMEOUT", "15")),
+}
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 1.5 并发控制 & 阶段计时
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+class StageTimer:
+    """按阶段累计耗时（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            calls, total, worst = self._stats.get(stage, (0, 0.0, 0.0))
+            self._stats[stage] = (calls + 1, total + seconds, max(worst, seconds))
+
+    @contextmanager
+    def stage(self, name):
+        """计时一个阶段；同时写入 metrics 的 pipeline_stage_seconds 直方图与错误计数"""
+        start = time.perf_counter()
+        try:
+            with metrics.span("pipeline_stage", stage=name):
+                yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self):
+        """当前各阶段统计：{stage: {"calls", "total", "worst"}}"""
+        with self._lock:
+            return {name: {"calls": c, "total": t, "worst": w} for name, (c, t, w) in self._stats.items()}
+
+    def report(self, wall):
+        print(f"\n⏱️ 阶段耗时（墙钟 {wall:.2f}s）")
+        print(f"   {'阶段':<14}{'次数':>6}{'累计':>10}{'平均':>10}{'最慢':>10}")
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda kv: -kv[1][1])
+        for name, (calls, total, worst) in items:
+            print(f"   {name:<16}{calls:>6}{total:>9.2f}s{total / calls:>9.2f}s{worst:>9.2f}s")
+        busy = sum(total for _, (_, total, _) in items)
+        if wall > 0:
+            print(f"   串行等价 {busy:.2f}s → 并行加速 {busy / wall:.1f}x")
+
+
+timer = StageTimer()
+_upstream_slots = {name: threading.BoundedSemaphore(max(1, n)) for name, n in UPSTREAM_LIMITS.items()}
+
+
+@contextmanager
+def upstream(name, stage):
+    """限制单个上游的在途请求数，并把耗时记到对应阶段"""
+    with _upstream_slots[name]:
+        with timer.stage(stage):
+            yield
+
+
+class RunMemo:
+    """单次运行内的取数去重
+
+    以 (source, ticker) 为键，同一键只真正请求一次；并发调用方共享同一个
+    Future，等待在途请求而不是重复发起。run() 开始时清空。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source, key, fn):
+        k = (source, key.upper())
+        with self._lock:
+            fut = self._futures.get(k)
+            owner = fut is None
+            if owner:
+                fut = self._futures[k] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                fut.set_result(fn())
+            except BaseException as e:
+                fut.set_exception(e)
+        return fut.result()
+
+    def get_many(self, source, keys, fetch_many):
+        """批量版 get：只为尚未认领的键调用一次 fetch_many(keys) → dict"""
+        keys = list(dict.fromkeys(k.upper() for k in keys))
+        owned = []
+        with self._lock:
+            for k in keys:
+                if (source, k) in self._futures:
+                    self.hits += 1
+                else:
+                    self._futures[(source, k)] = Future()
+                    self.misses += 1
+                    owned.append(k)
+            futs = {k: self._futures[(source, k)] for k in keys}
+        if owned:
+            try:
+                results = fetch_many(owned)
+            except BaseException as e:
+                for k in owned:
+                    futs[k].set_exception(e)
+            else:
+                for k in owned:
+                    futs[k].set_result(results.get(k))
+        return {k: futs[k].result() for k in keys}
+
+    def clear(self):
+        with self._lock:
+            self._futures.clear()
+            self.hits = self.misses = 0
+
+
+memo = RunMemo()
+
+
+@metrics.register_collector
+def _memo_metrics():
+    return [("run_memo_hits", {}, memo.hits), ("run_memo_misses", {}, memo.misses)]
+
+
+def run_memoized(source):
+    """装饰 fn(ticker)，使其在同一次运行内按 (source, ticker) 去重"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(ticker):
+            return memo.get(source, ticker, lambda: fn(ticker))
+        return wrapper
+    return decorator
+
+
+# 单只股票内部扇出用的独立线程池（与 run() 的新闻线程池分开，避免嵌套提交死锁）
+_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="fetch")
+# 批量报价缺失时的 Finnhub 单只回退：_download_quotes 可能本身就跑在 _fetch_pool 里，另用一个池
+_fallback_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="quote-fallback")
+
+
+def _await(future, source, ticker, default, submitted):
+    """等待单个数据源，超时或异常时返回默认值
+
+    超时从提交时刻（time.monotonic()）起算，几个数据源依次等待时不会累加。
+    """
+    try:
+        remaining = submitted + FETCH_TIMEOUTS[source] - time.monotonic()
+        result = future.result(timeout=max(0.0, remaining))
+    except FutureTimeout:
+        print(f"⚠️ {source} 超时 {ticker}（>{FETCH_TIMEOUTS[source]:.0f}s），跳过")
+        return default
+    except Exception as e:
+        print(f"⚠️ {source} 失败 {ticker}: {e}")
+        return default
+    return default if result is None else result
+
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 # 2. 飞书客户端
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
+# 飞书错误码：token 失效（刷新后重试）、频率限制（按 429 处理）
+LARK_TOKEN_ERRORS = {99991661, 99991663, 99991668}
+LARK_RATE_LIMITED = 99991400
+
+
+class LarkError(Exception):
+    """飞书接口失败；status_code 供 ratelimit 判断是否退避重试，retryable=False 表示重试也没用"""
+
+    def __init__(self, message, status_code=None, retryable=True):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+
 class LarkClient:
     def __init__(self):
         self._token = None
         self._expire = 0
+        self._token_lock = threading.Lock()
     
     def get_token(self):
-        now = datetime.datetime.now().timestamp()
-        if self._token and now < self._expire - 60:
-            return self._token
-        
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-        res = requests.post(url, json={
-            "app_id": cfg["lark_id"],
-            "app_secret": cfg["lark_secret"]
-        }, timeout=10)
-        data = res.json()
-        
-        if data.get("code") == 0:
-            self._token = data["tenant_access_token"]
-            self._expire = now + data.get("expire", 7200)
-            return self._token
-        print(f"❌ Token 失败: {data}")
-        return None
+        """tenant token；过期前 60 秒刷新，并发调用只有一个线程真正去请求（single-flight）"""
+        with self._token_lock:
+            now = datetime.datetime.now().timestamp()
+            if self._token and now < self._expire - 60:
+                return self._token
+            
+            url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
+            with upstream("lark", "lark_token"):
+                res = http_pool.session().post(url, json={
+                    "app_id": cfg["lark_id"],
+                    "app_secret": cfg["lark_secret"]
+                }, timeout=10)
+            data = res.json()
+            
+            if data.get("code") == 0:
+                self._token = data["tenant_access_token"]
+                self._expire = now + data.get("expire", 7200)
+                return self._token
+            print(f"❌ Token 失败: {data}")
+            return None
     
-    def send_card(self, card):
+    def invalidate_token(self, token):
+        """token 被服务端判定失效时丢弃（只丢弃仍是这一个的情况，避免冲掉别的线程刚刷新的）"""
+        with self._token_lock:
+            if self._token == token:
+                self._token = None
+    
+    def deliver(self, chat_id, content):
+        """发送一条已序列化的卡片（content 为卡片 JSON 字符串）；失败抛 LarkError"""
         token = self.get_token()
         if not token:
-            return False
+            raise LarkError("获取 tenant token 失败")
         
         url = "https://open.feishu.cn/open-apis/im/v1/messages?receive_id_type=chat_id"
-        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-        payload = {
-            "receive_id": cfg["chat_id"],
-            "msg_type": "interactive",
-            "content": json.dumps(card, ensure_ascii=False)
-        }
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json; charset=utf-8"}
+        # 请求体直接拼接：卡片已序列化过，这里不再经过 dict → json 的往返
+        body = '{"receive_id":%s,"msg_type":"interactive","content":%s}' % (
+            json.dumps(chat_id), json.dumps(content, ensure_ascii=False))
         
-        resp = requests.post(url, headers=headers, json=payload, timeout=15)
-        result = resp.json()
-        return result.get("code") == 0
+        with upstream("lark", "send"):
+            resp = http_pool.session().post(url, headers=headers, data=body.encode("utf-8"), timeout=15)
+        try:
+            result = resp.json()
+        except ValueError:
+            result = {}
+        code = result.get("code")
+        if code == 0:
+            return
+        
+        message = f"HTTP {resp.status_code} code={code} {result.get('msg', '')}".strip()
+        if code in LARK_TOKEN_ERRORS:
+            self.invalidate_token(token)
+            raise LarkError(message)
+        if code == LARK_RATE_LIMITED or resp.status_code == 429:
+            raise LarkError(message, status_code=429)
+        if resp.status_code >= 500:
+            raise LarkError(message, status_code=resp.status_code)
+        # 其余是请求本身的问题（卡片格式、机器人不在群里等）
+        raise LarkError(message, status_code=resp.status_code, retryable=code is None)
+    
+    def send_card(self, card, chat_ids=None):
+        """同步发送一张卡片到各个群（不经发送队列），全部成功时返回 True"""
+        content = json.dumps(card, ensure_ascii=False)
+        ok = True
+        for chat_id in chat_ids or cfg["chat_ids"]:
+            try:
+                self.deliver(chat_id, content)
+            except LarkError as e:
+                print(f"❌ 卡片发送失败 → {chat_id}: {e}")
+                ok = False
+        return ok
+
+
+def start_delivery():
+    """启动后台发送：先投递上次运行遗留的卡片，本次入队的随到随发"""
+    box = outbox.default_outbox()
+    box.purge()
+    leftover = box.counts()["pending"]
+    if leftover:
+        print(f"📮 发送队列中有 {leftover} 张上次未送达的卡片，重新投递")
+    return outbox.Sender(box, lark_client().deliver, provider="lark",
+                         workers=UPSTREAM_LIMITS["lark"]).start()
+
+
+def enqueue_card(sender, card, label):
+    """卡片序列化一次，入队发往所有群（落盘后即视为已交付，之后由 sender 负责送达）"""
+    sender.outbox.enqueue(cfg["chat_ids"], card, label=label)
+    sender.notify()
 
-lark = LarkClient()
+
+def finish_delivery(sender):
+    """等待发送队列投递完（最多 cfg["outbox_drain"] 秒），打印并返回统计"""
+    with timer.stage("lark_drain"):
+        result = sender.close(cfg["outbox_drain"])
+    print(f"📮 发送队列: 本次送达 {result['sent']} | 失败待重试 {result['pending']} | 放弃 {result['dead']}")
+    if len(sender.destinations) > 1 or result["failed"] or result["dead"]:
+        for chat_id, d in sorted(sender.destinations.items()):
+            attempts = d["sent"] + d["failed"] + d["dead"]
+            line = (f"   → {chat_id}: 送达 {d['sent']} | 失败 {d['failed'] + d['dead']}"
+                    f" | 平均 {d['seconds'] / attempts * 1000:.0f}ms | 最慢 {d['worst'] * 1000:.0f}ms")
+            if d["error"]:
+                line += f" | 最近错误: {d['error']}"
+            print(line)
+    return result
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 # 3. 数据获取层
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
+def find_tickers(text):
+    """找出文本中所有公司名命中（Aho-Corasick 自动机，按位置排序）"""
+    return ticker_matcher.default_matcher(COMPANY_MAP).find(text)
+
+
+def rank_tickers(title, body=""):
+    """候选 ticker 按相关性打分排序（位置、出现次数、已知代码、歧义消解）"""
+    return ticker_matcher.default_matcher(COMPANY_MAP).rank(title, body, EXCLUDE_TICKERS)
+
+
 def extract_ticker(text):
-    """从新闻识别股票代码"""
-    text_lower = text.lower()
-    for company, ticker in COMPANY_MAP.items():
-        if company in text_lower:
-            return ticker
-    
-    matches = re.findall(r'\b([A-Z]{2,5})\b', text)
-    for m in matches:
-        if m not in EXCLUDE_TICKERS:
-            return m
+    """从新闻识别股票代码（最高分候选；没有可信候选时退回 SPY）"""
+    ranked = rank_tickers(text)
+    if ranked and ranked[0].score >= ticker_matcher.MIN_CONFIDENCE:
+        return ranked[0].ticker
     return "SPY"
 
 
-def get_stock_quote(ticker):
-    """获取实时报价（Finnhub）"""
+def _finnhub_quote(ticker):
+    """单只报价（Finnhub）"""
     try:
-        q = fh_client.quote(ticker.upper())
+        with upstream("finnhub", "quote"):
+            q = ratelimit.call("finnhub", finnhub_client().quote, ticker.upper())
         if q.get('c') and q.get('pc'):
             price = q['c']
             prev = q['pc']
@@ -150,35 +505,120 @@ def get_stock_quote(ticker):
     return None
 
 
+def _download_quotes(tickers):
+    """一次 yf.download 拉取所有 ticker 最近两个收盘价，列向量化计算涨跌幅
+
+    批量结果里缺失的 ticker 再并发回退到 Finnhub 单只报价。
+    """
+    import pandas as pd
+    results = {}
+    try:
+        with upstream("yfinance", "quote_batch"):
+            df = yfinance().download(tickers, period="5d", interval="1d", progress=False,
+                             auto_adjust=False, group_by="column")
+        closes = df["Close"]
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(tickers[0])
+        closes = closes.ffill().tail(2)
+        if len(closes) == 2:
+            price, prev = closes.iloc[-1], closes.iloc[-2]
+            frame = pd.DataFrame({
+                "price": price,
+                "prev": prev,
+                "change": (price / prev - 1.0) * 100.0,
+            }).dropna()
+            for t, row in frame.iterrows():
+                results[str(t).upper()] = {
+                    "price": float(row["price"]),
+                    "change": float(row["change"]),
+                    "prev": float(row["prev"]),
+                }
+    except Exception as e:
+        print(f"⚠️ 批量报价失败 {tickers}: {e}")
+
+    missing = [t for t in tickers if t not in results]
+    fallbacks = {t: _fallback_pool.submit(_finnhub_quote, t) for t in missing}
+    for t, fut in fallbacks.items():
+        results[t] = fut.result()
+    return results
+
+
+def get_quotes(tickers):
+    """批量报价：返回 {ticker: quote or None}
+
+    本次运行已取过（或正在取）的 ticker 直接复用，其余合并成一次批量请求。
+    """
+    return memo.get_many("quote", tickers, _download_quotes)
+
+
+def get_stock_quote(ticker):
+    """获取单只报价（走批量引擎）"""
+    return get_quotes([ticker]).get(ticker.upper())
+
+
+def _refresh_prices(tickers):
+    """把本地日线补齐到最近一个收盘日（已是最新的 ticker 不发请求，其余合并成一次 yf.download）"""
+    def download(missing, start):
+        with upstream("yfinance", "price_history"):
+            return yfinance().download(missing, start=start, interval="1d", progress=False,
+                                       auto_adjust=False, group_by="column")
+    try:
+        price_history().refresh(tickers, download)
+    except Exception as e:
+        print(f"⚠️ 日线补齐失败 {tickers}: {e}")
+    return {t: True for t in tickers}
+
+
+def ensure_prices(tickers):
+    """本次运行内每个 ticker 只补一次日线"""
+    return memo.get_many("prices", tickers, _refresh_prices)
+
+
+FUNDAMENTAL_FIELDS = [
+    "trailingPE", "forwardPE", "sector", "marketCap", "targetMeanPrice",
+    "targetHighPrice", "targetLowPrice", "recommendationKey",
+    "fiftyTwoWeekHigh", "fiftyTwoWeekLow", "beta", "shortName",
+]
+
+
+def _fetch_info(ticker):
+    with upstream("yfinance", "fundamentals"):
+        return yfinance().Ticker(ticker).info
+
+
+@run_memoized("fundamentals")
 def get_stock_fundamentals(ticker):
-    """获取基本面数据（yfinance）"""
+    """获取基本面数据（yfinance，经本地缓存）"""
     try:
-        t = yf.Ticker(ticker)
-        info = t.info
+        info = fundamentals_cache().get_info(
+            ticker, lambda: _fetch_info(ticker), FUNDAMENTAL_FIELDS
+        )
         
         return {
             "pe": info.get('trailingPE'),
             "forward_pe": info.get('forwardPE'),
-            "sector": info.get('sector', 'Unknown'),
+            "sector": info.get('sector') or 'Unknown',
             "market_cap": info.get('marketCap'),
             "target_price": info.get('targetMeanPrice'),
             "target_high": info.get('targetHighPrice'),
             "target_low": info.get('targetLowPrice'),
-            "recommendation": info.get('recommendationKey', 'none'),
+            "recommendation": info.get('recommendationKey') or 'none',
             "week_52_high": info.get('fiftyTwoWeekHigh'),
             "week_52_low": info.get('fiftyTwoWeekLow'),
             "beta": info.get('beta'),
-            "short_name": info.get('shortName', ticker),
+            "short_name": info.get('shortName') or ticker,
         }
     except Exception as e:
         print(f"⚠️ yfinance 失败 {ticker}: {e}")
         return {}
 
 
+@run_memoized("analyst")
 def get_analyst_ratings(ticker):
     """获取分析师评级（Finnhub）"""
     try:
-        trends = fh_client.recommendation_trends(ticker)
+        with upstream("finnhub", "analyst"):
+            trends = ratelimit.call("finnhub", finnhub_client().recommendation_trends, ticker)
         if trends:
             latest = trends[0]
             total = latest.get('buy', 0) + latest.get('hold', 0) + latest.get('sell', 0) + \
@@ -203,15 +643,10 @@ def get_analyst_ratings(ticker):
 
 def get_market_overview():
     """获取市场概览"""
-    indices = [
-        ("SPY", "S&P500"),
-        ("QQQ", "纳指100"),
-        ("DIA", "道指"),
-    ]
-    
+    quotes = get_quotes([ticker for ticker, _ in MARKET_INDICES])
     results = []
-    for ticker, name in indices:
-        quote = get_stock_quote(ticker)
+    for ticker, name in MARKET_INDICES:
+        quote = quotes.get(ticker)
         if quote:
             chg = quote['change']
             emoji = "🟢" if chg > 0 else "🔴" if chg < 0 else "⚪"
@@ -229,8 +664,9 @@ def get_market_overview():
 def get_vix():
     """获取 VIX 恐慌指数"""
     try:
-        vix = yf.Ticker("^VIX")
-        price = vix.info.get('regularMarketPrice') or vix.info.get('previousClose')
+        with upstream("yfinance", "vix"):
+            info = yfinance().Ticker("^VIX").info
+        price = info.get('regularMarketPrice') or info.get('previousClose')
         if price:
             if price < 15:
                 level = "低恐慌"
@@ -260,7 +696,8 @@ def get_philly_fed():
             "limit": 1,
             "sort_order": "desc"
         }
-        resp = requests.get(url, params=params, timeout=5)
+        with upstream("fred", "fred"):
+            resp = http_pool.session().get(url, params=params, timeout=5)
         if resp.ok:
             val = resp.json().get('observations', [{}])[0].get('value', 'N/A')
             return float(val)
@@ -269,19 +706,31 @@ def get_philly_fed():
     return None
 
 
+@run_memoized("comprehensive")
 def get_comprehensive_data(ticker):
-    """获取股票的综合数据"""
+    """获取股票的综合数据（三个数据源并发请求，各自超时）"""
+    submitted = time.monotonic()
+    quote_fut = _fetch_pool.submit(get_stock_quote, ticker)
+    fund_fut = _fetch_pool.submit(get_stock_fundamentals, ticker)
+    analyst_fut = _fetch_pool.submit(get_analyst_ratings, ticker)
+    prices_fut = _fetch_pool.submit(ensure_prices, [ticker])
+
     data = {
         "ticker": ticker.upper(),
-        "quote": get_stock_quote(ticker),
-        "fundamentals": get_stock_fundamentals(ticker),
-        "analyst": get_analyst_ratings(ticker),
+        "quote": _await(quote_fut, "quote", ticker, None, submitted),
+        "fundamentals": _await(fund_fut, "fundamentals", ticker, {}, submitted),
+        "analyst": _await(analyst_fut, "analyst", ticker, None, submitted),
     }
     
-    # 计算 52 周位置
+    # 计算 52 周位置：本地日线 + 实时价优先，没有本地历史时用 yfinance info 的区间
     fund = data["fundamentals"]
     quote = data["quote"]
-    if fund.get("week_52_high") and fund.get("week_52_low") and quote:
+    week52 = None
+    if quote and _await(prices_fut, "prices", ticker, None, submitted):
+        week52 = price_history().week52(ticker, quote["price"])
+    if week52 and week52["position"] is not None:
+        data["week_52_position"] = week52["position"]
+    elif fund.get("week_52_high") and fund.get("week_52_low") and quote:
         high = fund["week_52_high"]
         low = fund["week_52_low"]
         price = quote["price"]
@@ -309,10 +758,50 @@ def get_comprehensive_data(ticker):
 # 4. AI 分析引擎
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-def analyze_with_ai(title, ticker, data):
-    """AI 深度分析"""
-    
-    # 构建数据上下文
+GEMINI_MODEL = "gemini-2.0-flash"
+# 改动 prompt 或解析规则时递增，旧的缓存分析随之失效
+PROMPT_VERSION = "v7.1"
+
+ANALYST_PERSONA = """你是 Citadel 首席宏观策略师，同时拥有沃顿商学院金融学博士学位。
+你的分析以"穿透本质、冷峻专业、逻辑严密"著称。"""
+
+ANALYSIS_RULES = """要求：
+1. 必须有具体逻辑推理，不说空话套话
+2. 每句话必须完整，不能截断
+3. 结合量化数据进行分析
+4. 如果数据不足，基于新闻内容合理推断
+"""
+
+# 结果字段 → 最大长度（卡片排版限制）
+ANALYSIS_FIELDS = {
+    "core": 40,
+    "logic": 60,
+    "valuation": 40,
+    "risk": 30,
+    "action": 40,
+}
+
+DEFAULT_ANALYSIS = {
+    "score": 5,
+    "core": "影响中性，需持续观察。",
+    "logic": "信息有限 → 市场观望 → 短期波动有限",
+    "valuation": "当前估值合理，无明显偏离。",
+    "risk": "需关注后续发展。",
+    "action": "观望为主，等待更多信息。"
+}
+
+FAILED_ANALYSIS = {
+    "score": 5,
+    "core": "分析暂不可用。",
+    "logic": "系统繁忙，请稍后再试。",
+    "valuation": "数据不足。",
+    "risk": "无法评估。",
+    "action": "暂不操作。"
+}
+
+
+def build_data_context(ticker, data):
+    """把综合数据压成给模型看的几行文字"""
     ctx_parts = [f"股票: {ticker}"]
     
     if data.get("quote"):
@@ -340,10 +829,109 @@ def analyze_with_ai(title, ticker, data):
     if data.get("week_52_position"):
         ctx_parts.append(f"52周位置: {data['week_52_position']:.0f}%")
     
-    data_context = "\n".join(ctx_parts)
+    return "\n".join(ctx_parts)
+
+
+def cache_snapshot(data):
+    """数据快照（粗粒度取整），行情小幅波动时仍命中同一份缓存分析"""
+    def bucket(value, step):
+        return None if value is None else round(value / step) * step
+
+    quote = data.get("quote") or {}
+    fund = data.get("fundamentals") or {}
+    analyst = data.get("analyst") or {}
+    return {
+        "change": bucket(quote.get("change"), 0.5),
+        "pe": bucket(fund.get("pe"), 1),
+        "sector": fund.get("sector"),
+        "premium": bucket((data.get("pe_vs_sector") or {}).get("premium"), 5),
+        "analyst": [analyst.get("buy"), analyst.get("hold"), analyst.get("sell")],
+        "upside": bucket(data.get("upside"), 5),
+        "week52": bucket(data.get("week_52_position"), 10),
+    }
+
+
+def _analysis_key(title, ticker, data):
+    return analysis_key(title, ticker, cache_snapshot(data), PROMPT_VERSION)
+
+
+def parse_analysis_text(text):
+    """解析单条分析的纯文本输出"""
+    result = dict(DEFAULT_ANALYSIS)
+    
+    # 评分
+    m = re.search(r'评分:\s*(\d+)', text)
+    if m:
+        result["score"] = max(1, min(10, int(m.group(1))))
+    
+    # 核心判断
+    m = re.search(r'核心判断:\s*(.+?)(?=\n|因果链|$)', text, re.DOTALL)
+    if m:
+        result["core"] = m.group(1).strip()[:40]
+    
+    # 因果链
+    m = re.search(r'因果链:\s*(.+?)(?=\n|估值|$)', text, re.DOTALL)
+    if m:
+        result["logic"] = m.group(1).strip()[:60]
+    
+    # 估值视角
+    m = re.search(r'估值视角:\s*(.+?)(?=\n|风险|$)', text, re.DOTALL)
+    if m:
+        result["valuation"] = m.group(1).strip()[:40]
+    
+    # 风险提示
+    m = re.search(r'风险提示:\s*(.+?)(?=\n|操作|$)', text, re.DOTALL)
+    if m:
+        result["risk"] = m.group(1).strip()[:30]
+    
+    # 操作建议
+    m = re.search(r'操作建议:\s*(.+?)(?=\n|$)', text, re.DOTALL)
+    if m:
+        result["action"] = m.group(1).strip()[:40]
+    
+    return result
+
+
+def validate_analysis(item):
+    """校验批量结果中的单个对象，合法则返回规整后的 dict，否则返回 None"""
+    if not isinstance(item, dict):
+        return None
+    try:
+        score = int(item.get("score"))
+    except (TypeError, ValueError):
+        return None
+    result = {"score": max(1, min(10, score))}
+    for field, limit in ANALYSIS_FIELDS.items():
+        value = item.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        result[field] = value.strip()[:limit]
+    return result
+
+
+def _cacheable(result):
+    """只缓存完整解析出来的结果：失败占位、或有字段没解析出来（仍是 DEFAULT_ANALYSIS 的值）的不缓存，
+    下次重新生成，避免一次异常输出被钉在缓存里整个 TTL"""
+    return result is not FAILED_ANALYSIS and all(result[f] != DEFAULT_ANALYSIS[f] for f in ANALYSIS_FIELDS)
+
+
+def analyze_with_ai(title, ticker, data):
+    """AI 深度分析（先查内容寻址缓存）"""
+    key = _analysis_key(title, ticker, data)
+    cached = analysis_cache().get(key)
+    if cached is not None:
+        return cached
+    result = _generate_analysis(title, ticker, data)
+    if _cacheable(result):
+        analysis_cache().put(key, result)
+    return dict(result)
+
+
+def _generate_analysis(title, ticker, data):
+    """单条 Gemini 分析；失败时返回 FAILED_ANALYSIS"""
+    data_context = build_data_context(ticker, data)
     
-    prompt = f"""你是 Citadel 首席宏观策略师，同时拥有沃顿商学院金融学博士学位。
-你的分析以"穿透本质、冷峻专业、逻辑严密"著称。
+    prompt = f"""{ANALYST_PERSONA}
 
 【新闻标题】
 {title}
@@ -367,72 +955,115 @@ def analyze_with_ai(title, ticker, data):
 操作建议: [对持有者和观望者的建议，15-25字]
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-要求：
-1. 必须有具体逻辑推理，不说空话套话
-2. 每句话必须完整，不能截断
-3. 结合量化数据进行分析
-4. 如果数据不足，基于新闻内容合理推断
-"""
+{ANALYSIS_RULES}"""
     
     try:
-        resp = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
-        )
-        text = resp.text
-        
-        # 解析各字段
-        result = {
-            "score": 5,
-            "core": "影响中性，需持续观察。",
-            "logic": "信息有限 → 市场观望 → 短期波动有限",
-            "valuation": "当前估值合理，无明显偏离。",
-            "risk": "需关注后续发展。",
-            "action": "观望为主，等待更多信息。"
-        }
-        
-        # 评分
-        m = re.search(r'评分:\s*(\d+)', text)
-        if m:
-            result["score"] = max(1, min(10, int(m.group(1))))
-        
-        # 核心判断
-        m = re.search(r'核心判断:\s*(.+?)(?=\n|因果链|$)', text, re.DOTALL)
-        if m:
-            result["core"] = m.group(1).strip()[:40]
-        
-        # 因果链
-        m = re.search(r'因果链:\s*(.+?)(?=\n|估值|$)', text, re.DOTALL)
-        if m:
-            result["logic"] = m.group(1).strip()[:60]
-        
-        # 估值视角
-        m = re.search(r'估值视角:\s*(.+?)(?=\n|风险|$)', text, re.DOTALL)
-        if m:
-            result["valuation"] = m.group(1).strip()[:40]
-        
-        # 风险提示
-        m = re.search(r'风险提示:\s*(.+?)(?=\n|操作|$)', text, re.DOTALL)
-        if m:
-            result["risk"] = m.group(1).strip()[:30]
-        
-        # 操作建议
-        m = re.search(r'操作建议:\s*(.+?)(?=\n|$)', text, re.DOTALL)
-        if m:
-            result["action"] = m.group(1).strip()[:40]
-        
-        return result
+        with upstream("gemini", "ai"):
+            resp = ratelimit.call(
+                "gemini",
+                gemini_client().models.generate_content,
+                model=GEMINI_MODEL,
+                contents=prompt
+            )
+        return parse_analysis_text(resp.text)
         
     except Exception as e:
         print(f"⚠️ AI 分析失败: {e}")
-        return {
-            "score": 5,
-            "core": "分析暂不可用。",
-            "logic": "系统繁忙，请稍后再试。",
-            "valuation": "数据不足。",
-            "risk": "无法评估。",
-            "action": "暂不操作。"
-        }
+        return FAILED_ANALYSIS
+
+
+def analyze_batch(items):
+    """批量 AI 分析：items 为 [(title, ticker, data)]，一次请求返回全部结果
+
+    已缓存的条目直接复用；其余要求模型输出 JSON 数组，逐项校验，
+    解析失败的条目单独回退到逐条请求。
+    """
+    keys = [_analysis_key(*item) for item in items]
+    results = [analysis_cache().get(key) for key in keys]
+    pending = [i for i, r in enumerate(results) if r is None]
+    if not pending:
+        return results
+    if len(pending) < len(items):
+        print(f"   ♻️ {len(items) - len(pending)} 条分析命中缓存")
+    
+    fresh = _generate_batch([items[i] for i in pending])
+    for i, result in zip(pending, fresh):
+        results[i] = dict(result)
+        if _cacheable(result):
+            analysis_cache().put(keys[i], result)
+    return results
+
+
+def _echo_matches(item, title, ticker):
+    """批量结果回显的股票代码和标题是否对应这条新闻（标题只比较去掉标点空白后的前 20 个字符）"""
+    def norm(text):
+        return re.sub(r"\W+", "", str(text or "")).lower()[:20]
+    return (str(item.get("ticker") or "").strip().upper() == ticker.upper()
+            and norm(item.get("title")) == norm(title))
+
+
+def _generate_batch(items):
+    """一次 Gemini 请求分析多条新闻，无效条目逐条回退
+
+    返回的 id 必须在范围内且不重复，回显的股票代码和标题必须与该条新闻一致，否则该条逐条重试，
+    不按位置猜测对应关系。
+    """
+    blocks = []
+    for i, (title, ticker, data) in enumerate(items):
+        blocks.append(f"### 新闻 {i}\n【股票代码】{ticker}\n【新闻标题】{title}\n"
+                      f"【量化数据】\n{build_data_context(ticker, data)}")
+    
+    prompt = f"""{ANALYST_PERSONA}
+
+下面有 {len(items)} 条新闻，请逐条分析。
+
+{chr(10).join(blocks)}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+只输出一个 JSON 数组，每条新闻一个对象，按新闻编号顺序，字段全部必填（中文）：
+[{{"id": 新闻编号,
+  "ticker": "该条新闻的【股票代码】，原样照抄",
+  "title": "该条新闻的【新闻标题】，原样照抄",
+  "score": 1-10的整数（1=极度利空，5=中性，10=极度利好）,
+  "core": "核心判断：利好/利空及影响程度，15-25字",
+  "logic": "因果链：用 A → B → C 格式，25-40字",
+  "valuation": "估值视角：结合P/E和目标价，判断是否已Price In，15-25字",
+  "risk": "风险提示：最大的不确定性，15-20字",
+  "action": "操作建议：对持有者和观望者的建议，15-25字"}}]
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+{ANALYSIS_RULES}"""
+    
+    results = [None] * len(items)
+    try:
+        with upstream("gemini", "ai_batch"):
+            resp = ratelimit.call(
+                "gemini",
+                gemini_client().models.generate_content,
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config={"response_mime_type": "application/json"}
+            )
+        parsed = json.loads(resp.text)
+        by_id = {}
+        for item in parsed if isinstance(parsed, list) else []:
+            idx = item.get("id") if isinstance(item, dict) else None
+            if isinstance(idx, int) and not isinstance(idx, bool) and 0 <= idx < len(items):
+                by_id.setdefault(idx, []).append(item)
+        for idx, matches in by_id.items():
+            # 同一 id 出现多次时无法判断哪个对应哪条新闻，整条重试
+            if len(matches) == 1 and _echo_matches(matches[0], *items[idx][:2]):
+                results[idx] = validate_analysis(matches[0])
+    except Exception as e:
+        print(f"⚠️ 批量 AI 分析失败，逐条回退: {e}")
+    
+    retry = [i for i, r in enumerate(results) if r is None]
+    if retry and len(retry) < len(items):
+        print(f"   ↩️ {len(retry)} 条批量结果无效，逐条重试")
+    futures = {i: _fetch_pool.submit(_generate_analysis, *items[i]) for i in retry}
+    for i, fut in futures.items():
+        results[i] = fut.result()
+    return results
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 # 5. 卡片构建
@@ -506,7 +1137,7 @@ def build_market_overview_card(market_data, vix, philly_fed):
     }
 
 
-def build_news_card(title, data, analysis):
+def build_news_card(title, data, analysis, source="WSJ"):
     """构建新闻分析卡片"""
     score = analysis["score"]
     ticker = data["ticker"]
@@ -523,8 +1154,8 @@ def build_news_card(title, data, analysis):
     short_title = title[:26] + "..." if len(title) > 26 else title
     
     # 第一行：股票基本信息
-    quote = data.get("quote", {})
-    fund = data.get("fundamentals", {})
+    quote = data.get("quote") or {}
+    fund = data.get("fundamentals") or {}
     
     price_str = f"${quote['price']:.2f}" if quote.get("price") else "--"
     change_str = f"{quote['change']:+.2f}%" if quote.get("change") else "--"
@@ -533,7 +1164,7 @@ def build_news_card(title, data, analysis):
     pe_str = f"{fund.get('pe', 0):.1f}" if fund.get('pe') else "--"
     
     # 分析师信息
-    analyst = data.get("analyst", {})
+    analyst = data.get("analyst") or {}
     if analyst:
         analyst_str = f"{analyst.get('consensus', '--')} ({analyst.get('buy', 0)}/{analyst.get('hold', 0)}/{analyst.get('sell', 0)})"
     else:
@@ -649,7 +1280,7 @@ def build_news_card(title, data, analysis):
                 "tag": "note",
                 "elements": [{
                     "tag": "plain_text",
-                    "content": f"评分 {score}/10 | {signal} | WSJ | Citadel AI"
+                    "content": f"评分 {score}/10 | {signal} | {source} | Citadel AI"
                 }]
             }
         ]
@@ -659,89 +1290,213 @@ def build_news_card(title, data, analysis):
 # 6. 主程序
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
+def collect_article(idx, total, entry, ticker):
+    """单条新闻的取数阶段（可在线程池中运行）
+
+    日志先缓存在 lines 里，由主线程按新闻顺序统一打印，避免并发输出交错。
+    """
+    title = entry.get('title', 'No Title')
+    lines = [f"\n{'─' * 50}", f"📄 [{idx + 1}/{total}] {title[:50]}..."]
+    lines.append(f"   🔍 标的: {ticker}")
+
+    # 获取综合数据
+    stock_data = get_comprehensive_data(ticker)
+
+    if stock_data.get("quote"):
+        q = stock_data["quote"]
+        lines.append(f"   💰 价格: ${q['price']:.2f} ({q['change']:+.2f}%)")
+
+    if stock_data.get("fundamentals", {}).get("pe"):
+        lines.append(f"   📈 P/E: {stock_data['fundamentals']['pe']:.1f}")
+
+    if stock_data.get("analyst"):
+        a = stock_data["analyst"]
+        lines.append(f"   👥 分析师: {a['consensus']} ({a['buy']}/{a['hold']}/{a['sell']})")
+
+    if stock_data.get("upside"):
+        lines.append(f"   🎯 目标价空间: {stock_data['upside']:+.1f}%")
+
+    return title, stock_data, lines
+
+
+def finish_article(entry, stock_data, analysis, lines):
+    """记录 AI 结果并构建卡片"""
+    lines.append(f"   ✨ 评分: {analysis['score']}/10")
+    lines.append(f"   📝 判断: {analysis['core']}")
+    with timer.stage("card_build"):
+        card = build_news_card(entry.get('title', 'No Title'), stock_data, analysis, entry.get('source', 'WSJ'))
+    return card, lines
+
+
+def process_article(idx, total, entry, ticker):
+    """单条新闻：取数 → AI 分析 → 构建卡片（逐条模式）"""
+    title, stock_data, lines = collect_article(idx, total, entry, ticker)
+    analysis = analyze_with_ai(title, ticker, stock_data)
+    return finish_article(entry, stock_data, analysis, lines)
+
+
+def process_batch(pool, entries, tickers):
+    """批量模式：并发取数 → 一次 AI 请求 → 构建卡片；返回与 entries 对齐的 Future 列表"""
+    collected = [
+        pool.submit(collect_article, i, len(entries), e, t)
+        for i, (e, t) in enumerate(zip(entries, tickers))
+    ]
+    rows = [fut.result() for fut in collected]
+    analyses = analyze_batch([(title, t, data) for (title, data, _), t in zip(rows, tickers)])
+    futures = []
+    for entry, (_, data, lines), analysis in zip(entries, rows, analyses):
+        fut = Future()
+        fut.set_result(finish_article(entry, data, analysis, lines))
+        futures.append(fut)
+    return futures
+
+
+def select_entries(candidates, limit):
+    """识别 Ticker（纯本地计算），返回 (entries, tickers, skipped)
+
+    前 limit 条有可信标的的新闻进入 entries；没有可信标的的进入 skipped，
+    不触发任何取数或 AI 调用；超出 limit 的留给下一次运行。
+    """
+    entries, tickers, skipped = [], [], []
+    for e in candidates:
+        if len(entries) >= limit:
+            break
+        ranked = rank_tickers(e.get('title', ''), e.get('summary', ''))
+        if ranked and ranked[0].score >= ticker_matcher.MIN_CONFIDENCE:
+            entries.append(e)
+            tickers.append(ranked[0].ticker)
+        else:
+            skipped.append(e)
+    return entries, tickers, skipped
+
+
+def collect_analyses(entries, tickers, workers=None):
+    """取数 + AI 分析，不构建飞书卡片（供后端新闻接口复用）
+
+    每次调用视为一次独立运行（清空运行内去重）；返回与 entries 对齐的 [(stock_data, analysis)]。
+    """
+    memo.clear()
+    if not entries:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, workers or cfg["workers"])) as pool:
+        rows = list(pool.map(lambda args: collect_article(*args),
+                             [(i, len(entries), e, t) for i, (e, t) in enumerate(zip(entries, tickers))]))
+        items = [(title, t, data) for (title, data, _), t in zip(rows, tickers)]
+        if cfg["ai_batch"]:
+            analyses = analyze_batch(items)
+        else:
+            analyses = list(pool.map(lambda item: analyze_with_ai(*item), items))
+    return [(data, analysis) for (_, data, _), analysis in zip(rows, analyses)]
+
+
 def run():
     print("=" * 60)
     print("🚀 Bloomberg V7.0 Pro 启动")
     print("=" * 60)
-    
-    # ========== 1. 市场概览 ==========
-    print("\n📈 获取市场数据...")
-    market_data = get_market_overview()
-    vix = get_vix()
-    philly_fed = get_philly_fed()
-    
-    for m in market_data:
-        print(f"   {m['emoji']} {m['name']}: {m['change']:+.2f}%")
-    if vix:
-        print(f"   🌡️ VIX: {vix['value']:.1f} ({vix['level']})")
-    if philly_fed:
-        print(f"   🏭 费城联储: {philly_fed:.1f}")
-    
-    # 发送市场概览卡片
-    overview_card = build_market_overview_card(market_data, vix, philly_fed)
-    if lark.send_card(overview_card):
-        print("✅ 市场概览卡片已发送")
-    else:
-        print("❌ 市场概览卡片发送失败")
-    
-    # ========== 2. 新闻分析 ==========
-    print("\n📰 抓取 WSJ 新闻...")
-    feed = feedparser.parse("https://feeds.a.dj.com/rss/WSJcomUSBusiness.xml")
-    
-    if not feed.entries:
-        print("⚠️ 无新闻可用")
-        return
-    
-    print(f"   找到 {len(feed.entries)} 条新闻")
-    
-    success_count = 0
-    for i, entry in enumerate(feed.entries[:4]):
-        title = entry.get('title', 'No Title')
-        summary = entry.get('summary', '')
-        
-        print(f"\n{'─' * 50}")
-        print(f"📄 [{i+1}/4] {title[:50]}...")
-        
-        # 识别 Ticker
-        full_text = title + " " + summary
-        ticker = extract_ticker(full_text)
-        print(f"   🔍 标的: {ticker}")
-        
-        # 获取综合数据
-        print(f"   📊 获取数据...")
-        stock_data = get_comprehensive_data(ticker)
-        
-        if stock_data.get("quote"):
-            q = stock_data["quote"]
-            print(f"   💰 价格: ${q['price']:.2f} ({q['change']:+.2f}%)")
-        
-        if stock_data.get("fundamentals", {}).get("pe"):
-            print(f"   📈 P/E: {stock_data['fundamentals']['pe']:.1f}")
-        
-        if stock_data.get("analyst"):
-            a = stock_data["analyst"]
-            print(f"   👥 分析师: {a['consensus']} ({a['buy']}/{a['hold']}/{a['sell']})")
-        
-        if stock_data.get("upside"):
-            print(f"   🎯 目标价空间: {stock_data['upside']:+.1f}%")
-        
-        # AI 分析
-        print(f"   🤖 AI 分析中...")
-        analysis = analyze_with_ai(title, ticker, stock_data)
-        print(f"   ✨ 评分: {analysis['score']}/10")
-        print(f"   📝 判断: {analysis['core']}")
-        
-        # 构建并发送卡片
-        card = build_news_card(title, stock_data, analysis)
-        if lark.send_card(card):
-            success_count += 1
-            print(f"   ✅ 卡片已发送")
+
+    check_config()
+    timer.reset()
+    memo.clear()
+    wall_start = time.perf_counter()
+    workers = max(1, cfg["workers"])
+    print(f"   ⚙️ 并发度: {workers}")
+    sender = start_delivery()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        vix_fut = pool.submit(get_vix)
+        philly_fut = pool.submit(get_philly_fed)
+
+        # 多源 RSS 与宏观数据同时抓取（增量模式下带条件请求头）
+        feed_list = feeds.load_feeds()
+        print(f"\n📰 抓取 {len(feed_list)} 个新闻源...")
+        state = feeds.FeedState() if cfg["incremental"] else None
+        with timer.stage("rss"):
+            ingest = feeds.ingest(feed_list, state)
+        for f in ingest.feeds:
+            mark = "304" if f["status"] == 304 else f"{f['fresh']}/{f['total']}" if f["status"] else "失败"
+            print(f"   · {f['id']}: {mark}")
+        # 新闻没有更新时只跳过新闻部分，市场概览照常发送
+        entries, tickers, skipped = [], [], []
+        if ingest.unchanged:
+            print("📭 所有源均未变化（304），本次只发送市场概览")
         else:
-            print(f"   ❌ 卡片发送失败")
-    
+            dup_count = sum(len(v) for v in ingest.duplicates.values())
+            print(f"   新条目 {len(ingest.entries)} 条（跨源折叠重复 {dup_count} 条）")
+            if not ingest.entries:
+                print("📭 没有新条目，本次只发送市场概览")
+            # 识别 Ticker（纯本地计算）：没有可信标的的新闻直接跳过，不触发任何取数或 AI 调用
+            entries, tickers, skipped = select_entries(ingest.entries, cfg["news_limit"])
+            if skipped:
+                print(f"   🚫 {len(skipped)} 条未识别到可信标的，跳过")
+
+        # 连同指数一起合并成一次批量报价；日线补齐在后台合并成一次请求
+        if tickers:
+            pool.submit(ensure_prices, tickers)
+        get_quotes([t for t, _ in MARKET_INDICES] + tickers)
+
+        # ========== 1. 市场概览 ==========
+        print("\n📈 获取市场数据...")
+        market_data = get_market_overview()
+        vix = vix_fut.result()
+        philly_fed = philly_fut.result()
+
+        for m in market_data:
+            print(f"   {m['emoji']} {m['name']}: {m['change']:+.2f}%")
+        if vix:
+            print(f"   🌡️ VIX: {vix['value']:.1f} ({vix['level']})")
+        if philly_fed:
+            print(f"   🏭 费城联储: {philly_fed:.1f}")
+
+        # 市场概览卡片入队，由后台发送（与新闻处理重叠）
+        enqueue_card(sender, build_market_overview_card(market_data, vix, philly_fed), "market-overview")
+
+        # ========== 2. 新闻分析（先并发处理，再按顺序发送）==========
+        if cfg["ai_batch"]:
+            futures = process_batch(pool, entries, tickers)
+        else:
+            futures = [
+                pool.submit(process_article, i, len(entries), e, t)
+                for i, (e, t) in enumerate(zip(entries, tickers))
+            ]
+
+        # 按原始顺序等待结果并入队，保证卡片顺序与 RSS 一致
+        delivered = []
+        for entry, fut in zip(entries, futures):
+            try:
+                card, lines = fut.result()
+            except Exception as e:
+                print(f"   ❌ 新闻处理失败: {e}")
+                continue
+            for line in lines:
+                print(line)
+            enqueue_card(sender, card, entry.get("link") or entry.get("title"))
+            delivered.append(entry)
+            print(f"   📮 卡片已入队")
+
+    # 已入队的条目记为已读（发送队列落盘，没送达的下次运行重投）；还有剩余新条目的源不保存条件头
+    if state:
+        feeds.commit(state, ingest, delivered + skipped)
+
     # ========== 3. 完成 ==========
     print(f"\n{'=' * 60}")
-    print(f"🏁 完成！成功发送 {success_count + 1}/5 条卡片")
+    delivery = finish_delivery(sender)
+    print(f"🏁 完成！本次生成 {len(delivered) + 1}/{len(entries) + 1} 条卡片，送达 {delivery['sent']} 条")
+    timer.report(time.perf_counter() - wall_start)
+    print(f"\n♻️ 运行内去重: 复用 {memo.hits} 次 / 实际请求 {memo.misses} 次")
+    for host, hs in http_pool.stats().items():
+        print(f"🔌 {host}: 请求 {hs['requests']} | 新建连接 {hs['connections']} | 复用 {hs['reused']}")
+    for provider, rl in ratelimit.stats().items():
+        if rl["calls"]:
+            print(f"🚦 {provider}: 调用 {rl['calls']} | 限流等待 {rl['throttled']} 次 {rl['wait_seconds']:.1f}s"
+                  f" | 重试 {rl['retries']} | 429 {rl['rate_limited']} | 失败 {rl['failures']}")
+    ac = analysis_cache().stats()
+    print(f"\n🧠 分析缓存: 命中 {ac['hits']} / 未命中 {ac['misses']} | 命中率 {ac['hit_rate']:.0%} | 条目 {ac['size']}")
+    fc = fundamentals_cache().stats()
+    print(f"🗄️ 基本面缓存: 命中 {fc['hits']} / 未命中 {fc['misses']}（过期 {fc['stale']}）"
+          f" | 命中率 {fc['hit_rate']:.0%} | 条目 {fc['size']} | 淘汰 {fc['evictions']}")
+    if cfg["metrics_jsonl"]:
+        metrics.write_jsonl(cfg["metrics_jsonl"], wall=round(time.perf_counter() - wall_start, 3))
+        print(f"📈 指标已导出 → {cfg['metrics_jsonl']}")
     print(f"{'=' * 60}")
 
 
@@ -0,0 +1,126 @@
+"""
+实时报价推送
+============
+backend/api_template.py 的 SSE 接口使用。
+
+- 每个 symbol 只有一个后台轮询任务，无论多少客户端订阅；上游请求数只与 symbol 数有关
+- 同时轮询的 symbol 总数有全局上限（STREAM_MAX_SYMBOLS），超出时新订阅被拒绝（HubFull）
+- 第一个订阅者到来时启动轮询，最后一个离开时停止
+- 只在值变化时推送；新订阅者立刻收到当前快照
+- 每个订阅一个有界队列，慢客户端丢弃最旧的更新（只关心最新值），不拖慢其他人
+"""
+
+import os
+import asyncio
+
+import metrics
+
+STREAM_POLL_SECONDS = float(os.getenv("STREAM_POLL_SECONDS", "5"))
+# 所有客户端合计最多同时轮询的 symbol 数
+STREAM_MAX_SYMBOLS = int(os.getenv("STREAM_MAX_SYMBOLS", "100"))
+
+
+class HubFull(Exception):
+    """订阅会让轮询的 symbol 总数超过上限"""
+
+
+class Subscription:
+    """一个客户端的订阅：symbol 列表 + 接收 (symbol, value) 的有界队列"""
+
+    def __init__(self, symbols, queue_size):
+        self.symbols = list(symbols)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class QuoteHub:
+    """symbol → 共享轮询任务 → 扇出到所有订阅队列"""
+
+    def __init__(self, fetch, interval=None, queue_size=32, max_symbols=None):
+        self.fetch = fetch  # async fetch(symbol) -> dict | None
+        self.interval = interval or STREAM_POLL_SECONDS
+        self.queue_size = queue_size
+        self.max_symbols = max_symbols or STREAM_MAX_SYMBOLS
+        self._subscribers = {}  # symbol → set(Subscription)
+        self._pollers = {}      # symbol → Task
+        self._last = {}         # symbol → 最近一次推送的值
+        self._stats = {"polls": 0, "updates": 0, "pushes": 0, "dropped": 0, "errors": 0, "rejected": 0}
+
+    def subscribe(self, symbols):
+        """订阅一组 symbol，返回 Subscription；新增的 symbol 超出全局上限时抛 HubFull"""
+        sub = Subscription(symbols, self.queue_size)
+        new = {symbol for symbol in sub.symbols if symbol not in self._pollers}
+        if len(self._pollers) + len(new) > self.max_symbols:
+            self._stats["rejected"] += 1
+            raise HubFull(f"轮询中的 symbol 已达上限 {self.max_symbols}")
+        for symbol in sub.symbols:
+            self._subscribers.setdefault(symbol, set()).add(sub)
+            if symbol in self._last:
+                self._offer(sub, symbol, self._last[symbol])
+            if symbol not in self._pollers:
+                self._pollers[symbol] = asyncio.create_task(self._poll(symbol))
+        return sub
+
+    def unsubscribe(self, sub):
+        for symbol in sub.symbols:
+            subs = self._subscribers.get(symbol)
+            if subs is None:
+                continue
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[symbol]
+                poller = self._pollers.pop(symbol, None)
+                if poller:
+                    poller.cancel()
+                # 没人订阅时旧值很快过期，下次订阅重新拉取
+                self._last.pop(symbol, None)
+
+    async def _poll(self, symbol):
+        while True:
+            self._stats["polls"] += 1
+            try:
+                with metrics.span("stream_poll"):
+                    value = await self.fetch(symbol)
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"Stream poll error {symbol}: {e}")
+                value = None
+            if value is not None and value != self._last.get(symbol):
+                self._last[symbol] = value
+                self._stats["updates"] += 1
+                for sub in list(self._subscribers.get(symbol, ())):
+                    self._offer(sub, symbol, value)
+            await asyncio.sleep(self.interval)
+
+    def _offer(self, sub, symbol, value):
+        if sub.queue.full():
+            sub.queue.get_nowait()
+            self._stats["dropped"] += 1
+        sub.queue.put_nowait((symbol, value))
+        self._stats["pushes"] += 1
+
+    def stats(self):
+        return dict(
+            self._stats,
+            symbols=len(self._pollers),
+            subscriptions=sum(len(s) for s in self._subscribers.values()),
+        )
+
+
+_hubs = []
+
+
+def register(hub):
+    """把 hub 的统计接入 /metrics（stream_*）"""
+    _hubs.append(hub)
+    return hub
+
+
+@metrics.register_collector
+def _metrics():
+    rows = []
+    for i, hub in enumerate(_hubs):
+        rows.extend((f"stream_{key}", {"hub": str(i)}, value) for key, value in hub.stats().items())
+    return rows
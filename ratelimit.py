@@ -0,0 +1,175 @@
+"""
+上游限流层
+==========
+push_telegram.py 和 backend/api_template.py 共用。
+
+- 每个 provider 一个令牌桶，按每分钟配额匀速放行，允许小幅突发
+- 429 / 5xx 自动重试：指数退避 + 随机抖动；429 时清空令牌桶让其他线程一起降速
+- 记录每个 provider 的等待时间、重试次数，供运行结束时打印
+- try_call: 不等待的版本，令牌不足时立即抛 Throttled（后端线程池用，不让 sleep 占住工作线程）
+- call_once: 等令牌但只发一次、失败不重试（调用方自己有重试队列时用，如 outbox）
+"""
+
+import os
+import time
+import random
+import threading
+
+import metrics
+
+# provider → (每分钟请求数, 突发容量)
+PROVIDER_LIMITS = {
+    "finnhub": (int(os.getenv("FINNHUB_RPM", "60")), int(os.getenv("FINNHUB_BURST", "5"))),
+    "gemini": (int(os.getenv("GEMINI_RPM", "15")), int(os.getenv("GEMINI_BURST", "3"))),
+    # 飞书发消息：每个应用 1000 次/分钟、50 次/秒
+    "lark": (int(os.getenv("LARK_RPM", "1000")), int(os.getenv("LARK_BURST", "10"))),
+}
+
+MAX_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "4"))
+BACKOFF_BASE = 1.0   # 秒
+BACKOFF_CAP = 30.0   # 秒
+
+
+class Throttled(Exception):
+    """try_call 时令牌桶没有余量"""
+
+    def __init__(self, provider, retry_after):
+        super().__init__(f"{provider} 限流中，{retry_after:.1f}s 后可重试")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """线程安全的令牌桶"""
+
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """取一个令牌，必要时阻塞；返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def try_acquire(self):
+        """不阻塞地取一个令牌：成功返回 0，否则返回还需等待的秒数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def drain(self):
+        """清空令牌（收到 429 时调用）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+
+_buckets = {name: TokenBucket(rpm, burst) for name, (rpm, burst) in PROVIDER_LIMITS.items()}
+_stats_lock = threading.Lock()
+_stats = {name: {"calls": 0, "throttled": 0, "wait_seconds": 0.0, "retries": 0, "rate_limited": 0, "failures": 0, "rejected": 0}
+          for name in PROVIDER_LIMITS}
+
+
+def _status_of(exc):
+    """从 finnhub / google-genai / requests 的异常里取 HTTP 状态码"""
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int) and value >= 100:
+            return value
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _retryable(status):
+    return status == 429 or (status is not None and 500 <= status < 600)
+
+
+def _bump(provider, **deltas):
+    with _stats_lock:
+        for key, value in deltas.items():
+            _stats[provider][key] += value
+
+
+def call(provider, fn, *args, **kwargs):
+    """在 provider 的配额内调用 fn，429/5xx 时抖动退避重试"""
+    bucket = _buckets[provider]
+    for attempt in range(MAX_RETRIES + 1):
+        waited = bucket.acquire()
+        _bump(provider, calls=1, throttled=int(waited > 0), wait_seconds=waited)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            status = _status_of(e)
+            if status == 429:
+                bucket.drain()
+                _bump(provider, rate_limited=1)
+            if not _retryable(status) or attempt == MAX_RETRIES:
+                _bump(provider, failures=1)
+                metrics.inc("ratelimit_errors_total", provider=provider, status=status or type(e).__name__)
+                raise
+            delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+            _bump(provider, retries=1, wait_seconds=delay)
+            time.sleep(delay)
+
+
+def try_call(provider, fn, *args, **kwargs):
+    """在 provider 的配额内调用 fn；没有令牌时立即抛 Throttled，失败也不在本线程里退避重试"""
+    bucket = _buckets[provider]
+    retry_after = bucket.try_acquire()
+    if retry_after:
+        _bump(provider, rejected=1)
+        raise Throttled(provider, retry_after)
+    _bump(provider, calls=1)
+    return _once(provider, bucket, fn, args, kwargs)
+
+
+def call_once(provider, fn, *args, **kwargs):
+    """在 provider 的配额内（必要时等令牌）调用一次 fn，失败直接抛出，由调用方决定是否重试"""
+    bucket = _buckets[provider]
+    waited = bucket.acquire()
+    _bump(provider, calls=1, throttled=int(waited > 0), wait_seconds=waited)
+    return _once(provider, bucket, fn, args, kwargs)
+
+
+def _once(provider, bucket, fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        status = _status_of(e)
+        if status == 429:
+            bucket.drain()
+            _bump(provider, rate_limited=1)
+        _bump(provider, failures=1)
+        metrics.inc("ratelimit_errors_total", provider=provider, status=status or type(e).__name__)
+        raise
+
+
+def stats():
+    """各 provider 的调用与等待统计"""
+    with _stats_lock:
+        return {name: dict(s, wait_seconds=round(s["wait_seconds"], 3)) for name, s in _stats.items()}
+
+
+@metrics.register_collector
+def _metrics():
+    return [(f"ratelimit_{key}", {"provider": name}, value)
+            for name, s in stats().items() for key, value in s.items()]
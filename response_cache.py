@@ -0,0 +1,139 @@
+"""
+后端响应缓存
+============
+backend/api_template.py 使用。
+
+- 每条缓存有两个期限：fresh（直接返回）和 stale（先返回旧值，后台刷新）
+- 同一个 key 的并发未命中合并成一次上游请求（single-flight）
+- 后台刷新失败时保留旧值，直到 stale 期限过去
+- 存储可替换：任何实现 get(key) / set(key, entry) / delete(key) 的对象都可以作为 store
+  （默认 MemoryStore，进程内 LRU）
+"""
+
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict, namedtuple
+
+import metrics
+
+# fresh_until / stale_until 为 time.time() 时间戳，便于外部存储跨进程共享
+CacheEntry = namedtuple("CacheEntry", ["value", "fresh_until", "stale_until"])
+
+
+class MemoryStore:
+    """进程内 LRU 存储"""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_MAX", "1000"))
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResponseCache:
+    """带 stale-while-revalidate 和 single-flight 的异步响应缓存"""
+
+    def __init__(self, store=None):
+        self.store = store or MemoryStore()
+        self._inflight = {}
+        self._stats = {"hits": 0, "stale": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "errors": 0}
+
+    async def get_or_fetch(self, key, fetch, ttl, stale_ttl=0, cacheable=None):
+        """返回 (value, state)，state 为 hit / stale / miss
+
+        fetch: 无参协程函数；cacheable(value) 返回 False 的结果（如上游全部失败）不写入缓存。
+        """
+        now = time.time()
+        entry = self.store.get(key)
+        if entry is not None and now < entry.fresh_until:
+            self._stats["hits"] += 1
+            return entry.value, "hit"
+        if entry is not None and now < entry.stale_until:
+            self._stats["stale"] += 1
+            if key not in self._inflight:
+                self._start(key, fetch, ttl, stale_ttl, cacheable, background=True)
+            return entry.value, "stale"
+
+        if key in self._inflight:
+            self._stats["coalesced"] += 1
+        else:
+            self._stats["misses"] += 1
+            self._start(key, fetch, ttl, stale_ttl, cacheable, background=False)
+        # shield：某个等待方被取消时不影响其他等待方和缓存写入
+        return await asyncio.shield(self._inflight[key]), "miss"
+
+    def _start(self, key, fetch, ttl, stale_ttl, cacheable, background):
+        task = asyncio.ensure_future(self._refresh(key, fetch, ttl, stale_ttl, cacheable))
+        self._inflight[key] = task
+        if background:
+            self._stats["refreshes"] += 1
+
+        def done(t):
+            self._inflight.pop(key, None)
+            if background and not t.cancelled() and t.exception() is not None:
+                print(f"⚠️ 后台刷新失败 {key}: {t.exception()}")
+
+        task.add_done_callback(done)
+
+    async def _refresh(self, key, fetch, ttl, stale_ttl, cacheable):
+        try:
+            value = await fetch()
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        if cacheable is None or cacheable(value):
+            now = time.time()
+            self.store.set(key, CacheEntry(value, now + ttl, now + ttl + stale_ttl))
+        return value
+
+    def invalidate(self, key):
+        self.store.delete(key)
+
+    def stats(self):
+        stats = dict(self._stats)
+        served = stats["hits"] + stats["stale"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = round((stats["hits"] + stats["stale"]) / served, 3) if served else 0.0
+        stats["inflight"] = len(self._inflight)
+        if hasattr(self.store, "__len__"):
+            stats["size"] = len(self.store)
+        return stats
+
+
+_cache = None
+
+
+def response_cache():
+    """进程内共享的 ResponseCache 单例"""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
+
+
+@metrics.register_collector
+def _metrics():
+    if _cache is None:
+        return []
+    return [(f"response_cache_{key}", {}, value) for key, value in _cache.stats().items()]
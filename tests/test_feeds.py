@@ -0,0 +1,148 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import feeds  # noqa: E402
+
+FIXTURE_DIR = os.path.join(ROOT, "fixtures", "feeds")
+
+
+def guids(entries):
+    return [feeds.entry_id(e) for e in entries]
+
+
+def all_guids(result):
+    """保留的条目加上被折叠的重复项"""
+    return guids(result.entries) + [g for dups in result.duplicates.values() for g in guids(dups)]
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """从 fixtures/feeds 读取全部已配置的源"""
+    monkeypatch.setattr(feeds, "FIXTURE_DIR", FIXTURE_DIR)
+    return feeds.load_feeds()
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.ok = 200 <= status_code < 400
+        self.content = content
+        self.headers = headers or {}
+
+
+class FakeSession:
+    """按 URL 返回夹具 XML，带 ETag；请求带匹配的 If-None-Match 时返回 304"""
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        headers = headers or {}
+        self.requests.append((url, headers))
+        etag = f'"{abs(hash(self.bodies[url]))}"'
+        if headers.get("If-None-Match") == etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.bodies[url], {"ETag": etag})
+
+
+@pytest.fixture
+def online(monkeypatch):
+    """两个源走条件 GET（不读夹具目录），返回 (feed 列表, FakeSession)"""
+    monkeypatch.setattr(feeds, "FIXTURE_DIR", None)
+    feed_list = []
+    bodies = {}
+    for feed_id in ("wsj_us_business", "cnbc_top"):
+        url = f"https://example.com/rss/{feed_id}"
+        with open(os.path.join(FIXTURE_DIR, f"{feed_id}.xml"), "rb") as f:
+            bodies[url] = f.read()
+        feed_list.append({"id": feed_id, "source": feed_id, "url": url})
+    session = FakeSession(bodies)
+    monkeypatch.setattr(feeds.http_pool, "session", lambda: session)
+    return feed_list, session
+
+
+def test_fixtures_cover_every_configured_feed(offline):
+    result = feeds.ingest(offline)
+    assert [f["id"] for f in result.feeds] == [f["id"] for f in offline]
+    assert all(f["status"] == 200 and f["total"] > 0 for f in result.feeds)
+
+
+def test_ingest_folds_cross_feed_duplicates(offline):
+    result = feeds.ingest(offline)
+    total = sum(f["total"] for f in result.feeds)
+    folded = [e for dups in result.duplicates.values() for e in dups]
+    assert len(result.entries) + len(folded) == total
+    assert not set(guids(result.entries)) & set(guids(folded))
+
+    # 同一条 Nvidia 新闻出现在三个源里，只保留最先轮到的 WSJ
+    assert sorted(guids(result.duplicates["wsj_us_business-1"])) == ["cnbc_top-1", "nasdaq_markets-4"]
+    assert guids(result.duplicates["wsj_markets-1"]) == ["cnbc_top-2"]
+
+    # 各源轮流取：第一轮每个源最多一条
+    first_round = [e["feed_url"] for e in result.entries[:len(offline) - 1]]
+    assert len(set(first_round)) == len(first_round)
+
+
+def test_commit_marks_delivered_and_their_duplicates_seen(offline, tmp_path):
+    state = feeds.FeedState(str(tmp_path / "feeds.sqlite"))
+    first = feeds.ingest(offline, state)
+    delivered = first.entries[:5]
+    feeds.commit(state, first, delivered)
+
+    second = feeds.ingest(offline, state)
+    seen = set(guids(delivered))
+    for guid in list(seen):
+        seen.update(guids(first.duplicates.get(guid, [])))
+    assert {"cnbc_top-1", "nasdaq_markets-4"} <= seen
+    # 轮流取的顺序变了，保留哪一份重复条目也可能变，只比较条目全集
+    assert not seen & set(all_guids(second))
+    assert set(all_guids(second)) == set(all_guids(first)) - seen
+
+
+def test_conditional_get_returns_unchanged(online):
+    feed_list, session = online
+    state = feeds.FeedState(":memory:")
+
+    first = feeds.ingest(feed_list, state)
+    assert [f["status"] for f in first.feeds] == [200, 200]
+    assert all("If-None-Match" not in headers for _, headers in session.requests)
+    feeds.commit(state, first, first.entries)
+
+    session.requests.clear()
+    second = feeds.ingest(feed_list, state)
+    assert all("If-None-Match" in headers for _, headers in session.requests)
+    assert second.unchanged
+    assert second.entries == []
+
+
+def test_leftover_entries_keep_feed_uncached(online):
+    feed_list, session = online
+    state = feeds.FeedState(":memory:")
+
+    first = feeds.ingest(feed_list, state)
+    # cnbc_top-1 折叠在 wsj_us_business-1 下，一并送达后 CNBC 全部处理完
+    delivered = [e for e in first.entries
+                 if e["feed_url"] == feed_list[1]["url"] or feeds.entry_id(e) == "wsj_us_business-1"]
+    feeds.commit(state, first, delivered)
+
+    # WSJ 还有没处理的条目：不保存条件头，下次仍完整抓取
+    assert state.validators(feed_list[0]["url"]) == (None, None)
+    assert state.validators(feed_list[1]["url"])[0] is not None
+
+    second = feeds.ingest(feed_list, state)
+    assert [f["status"] for f in second.feeds] == [200, 304]
+    assert guids(second.entries) == ["wsj_us_business-2", "wsj_us_business-3", "wsj_us_business-4"]
+
+
+def test_minhash_index_near_duplicates():
+    index = feeds.MinHashIndex()
+    assert index.add("a", "Nvidia Shares Climb After Chip Maker Raises Revenue Forecast") is None
+    assert index.add("b", "Nvidia shares climb after chipmaker raises revenue forecast") == "a"
+    assert index.add("c", "Oil prices slip as OPEC weighs output increase") is None
+    assert index.add("d", "Costco same-store sales rise 6% in December") is None
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ticker_matcher  # noqa: E402
+import push_telegram  # noqa: E402
+
+
+@pytest.mark.parametrize("title, ticker", [
+    ("Apple Unveils New iPhone With AI Features", "AAPL"),
+    ("Amazon Launches Drone Delivery in Texas", "AMZN"),
+    ("Meta Cuts Jobs", "META"),
+    ("Uber Beats Estimates", "UBER"),
+    ("Ford Recalls F-150 Trucks", "F"),
+])
+def test_title_case_company_headlines(title, ticker):
+    ranked = push_telegram.rank_tickers(title)
+    assert ranked and ranked[0].ticker == ticker
+    assert ranked[0].score >= ticker_matcher.MIN_CONFIDENCE
+    entries, tickers, skipped = push_telegram.select_entries([{"title": title, "summary": ""}], 4)
+    assert tickers == [ticker] and not skipped
+
+
+def test_headline_initial_ambiguous_alias():
+    assert push_telegram.rank_tickers("Target Raises Full-Year Forecast")[0].ticker == "TGT"
+
+
+def test_ambiguous_alias_without_context():
+    assert "TGT" not in {c.ticker for c in push_telegram.rank_tickers("Fed Says Inflation Target Still Far Off")}
+
+
+def test_parenthesised_unknown_symbol_is_not_a_ticker():
+    tickers = {c.ticker for c in push_telegram.rank_tickers("Earnings Per Share (EPS) Guide")}
+    assert "EPS" not in tickers
+
+
+def test_parenthesised_symbols():
+    assert push_telegram.rank_tickers("Chipmaker Rallies (NVDA)")[0].ticker == "NVDA"
+    assert push_telegram.rank_tickers("Small Biotech Soars (NASDAQ: ZZZQ)")[0].ticker == "ZZZQ"
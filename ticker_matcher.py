@@ -0,0 +1,227 @@
+"""
+Ticker 多模式匹配
+=================
+把「公司名/别名 → Ticker」编译成一个 Aho-Corasick 自动机，一次扫描找出文本里
+所有命中的公司名，复杂度与别名数量无关。
+
+别名来源：push_telegram.COMPANY_MAP（内置）+ 符号文件（SYMBOLS_FILE，默认
+data/symbols.csv，每行 `ticker,alias[,ambiguous]`）。自动机在首次使用时构建一次。
+
+rank() 在命中之上做相关性打分：位置（标题 > 正文、越靠前越高）、出现次数、
+是否为已知代码；常见英文词别名（target / apple ...）需要上下文佐证才算数。
+"""
+
+import os
+import re
+import csv
+import threading
+from collections import deque, namedtuple
+
+SYMBOLS_FILE = os.getenv("SYMBOLS_FILE") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "symbols.csv"
+)
+
+TickerMatch = namedtuple("TickerMatch", ["ticker", "alias", "start", "end"])
+TickerCandidate = namedtuple("TickerCandidate", ["ticker", "score", "mentions", "reasons"])
+
+# 同时是普通英文词的别名：必须大写，且位于标题开头或附近有公司/市场语境才算命中
+# （apple / amazon / meta / uber / ford 在财经新闻里几乎总是指公司，不列入）
+AMBIGUOUS_ALIASES = {
+    "target", "shell", "oracle", "johnson", "lilly",
+    "coke", "citi", "arm", "block inc", "visa inc", "dell", "delta",
+}
+
+# 佐证语境词（歧义别名前后 4 个词内出现其一即可）
+CONTEXT_WORDS = {
+    "inc", "corp", "co", "shares", "stock", "stocks", "earnings", "revenue", "sales",
+    "ceo", "retailer", "profit", "quarter", "guidance", "investors", "analysts",
+    "company", "chain", "maker", "giant", "rival", "brand", "stores",
+}
+
+MIN_CONFIDENCE = float(os.getenv("MIN_TICKER_CONFIDENCE", "0.5"))
+
+_CAPS_RE = re.compile(r"\b([A-Z]{2,5})\b")
+# 分组：1 $代码；2 带交易所前缀的括号代码；3 不带前缀的括号代码（只认已知代码）；4 交易所前缀
+_EXPLICIT_RE = re.compile(
+    r"(?:\$([A-Z]{1,5})\b"
+    r"|\((?:NYSE|NASDAQ|Nasdaq|AMEX):\s*([A-Z]{1,5})\)"
+    r"|\(([A-Z]{1,5})\)"
+    r"|(?:NYSE|NASDAQ|Nasdaq):\s*([A-Z]{1,5})\b)"
+)
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def normalize(text):
+    """小写化且保持长度不变（匹配位置可以直接映射回原文）"""
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+def _is_word_char(c):
+    return c.isalnum()
+
+
+class AhoCorasick:
+    """朴素字典实现的 Aho-Corasick 自动机"""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for alias, ticker in patterns.items():
+            self._add(alias, ticker)
+        self._build()
+
+    def _add(self, alias, ticker):
+        state = 0
+        for ch in alias:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(alias), ticker, alias))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter(self, text):
+        """逐个产出 (start, end, ticker, alias)，text 需已 normalize"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, ticker, alias in out[state]:
+                yield i - length + 1, i + 1, ticker, alias
+
+    def __len__(self):
+        return len(self._goto)
+
+
+class TickerMatcher:
+    """公司名/别名 → Ticker 匹配器（词边界正确，重叠时取最左最长）"""
+
+    def __init__(self, aliases, ambiguous=None):
+        self.aliases = {" ".join(normalize(a).split()): t.upper() for a, t in aliases.items() if a.strip()}
+        self.tickers = set(self.aliases.values())
+        self.ambiguous = {normalize(a) for a in (ambiguous if ambiguous is not None else AMBIGUOUS_ALIASES)}
+        self._automaton = AhoCorasick(self.aliases)
+
+    def find(self, text):
+        """返回文本中所有命中的 TickerMatch，按出现位置排序"""
+        norm = normalize(text)
+        hits = []
+        for start, end, ticker, alias in self._automaton.iter(norm):
+            if start > 0 and _is_word_char(norm[start - 1]):
+                continue
+            if end < len(norm) and _is_word_char(norm[end]):
+                continue
+            hits.append(TickerMatch(ticker, alias, start, end))
+
+        hits.sort(key=lambda m: (m.start, -(m.end - m.start)))
+        result, last_end = [], -1
+        for m in hits:
+            if m.start >= last_end:
+                result.append(m)
+                last_end = m.end
+        return result
+
+    def _corroborated(self, text, m):
+        """歧义别名：原文首字母大写，且位于开头、附近有语境词或紧跟所有格"""
+        if not text[m.start].isupper():
+            return False
+        if m.start == 0 or text[m.end:m.end + 2] in ("'s", "’s"):
+            return True
+        before = _WORD_RE.findall(normalize(text[max(0, m.start - 40):m.start]))[-4:]
+        after = _WORD_RE.findall(normalize(text[m.end:m.end + 40]))[:4]
+        return any(w in CONTEXT_WORDS for w in before + after)
+
+    def rank(self, title, body="", exclude=()):
+        """对标题+正文中的候选 ticker 打分，返回按分数降序的 TickerCandidate 列表"""
+        text = f"{title} {body}".strip()
+        title_len = len(title)
+        scores = {}
+
+        def mention(ticker, base, start, reason):
+            s = scores.setdefault(ticker, {"base": 0.0, "first": start, "mentions": 0, "reasons": []})
+            s["base"] = max(s["base"], base)
+            s["first"] = min(s["first"], start)
+            s["mentions"] += 1
+            s["reasons"].append(reason)
+
+        for m in self.find(text):
+            if m.alias in self.ambiguous:
+                if not self._corroborated(text, m):
+                    continue
+                mention(m.ticker, 0.3, m.start, f"歧义别名:{m.alias}")
+            else:
+                mention(m.ticker, 0.5, m.start, f"公司名:{m.alias}")
+
+        for m in _EXPLICIT_RE.finditer(text):
+            symbol = next(g for g in m.groups() if g)
+            if m.group(3) and symbol not in self.tickers:
+                continue  # "(EPS)" 这类缩写，不是代码
+            if symbol not in exclude:
+                mention(symbol, 0.6 if symbol in self.tickers else 0.45, m.start(), f"显式代码:{symbol}")
+
+        for m in _CAPS_RE.finditer(text):
+            symbol = m.group(1)
+            if symbol in self.tickers and symbol not in exclude:
+                mention(symbol, 0.35, m.start(), f"已知代码:{symbol}")
+
+        ranked = []
+        for ticker, s in scores.items():
+            score = s["base"]
+            if s["first"] < title_len:
+                score += 0.3
+            score += 0.1 * (1 - s["first"] / max(1, len(text)))
+            score += min(0.2, 0.1 * (s["mentions"] - 1))
+            ranked.append(TickerCandidate(ticker, round(min(1.0, score), 3), s["mentions"], s["reasons"]))
+        ranked.sort(key=lambda c: (-c.score, c.ticker))
+        return ranked
+
+
+def load_aliases(path=None):
+    """读取符号文件，返回 (别名 → ticker, 标记为歧义的别名集合)；文件不存在时为空"""
+    path = path or SYMBOLS_FILE
+    aliases, ambiguous = {}, set()
+    if not os.path.exists(path):
+        return aliases, ambiguous
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[0].startswith("#") or row[0] == "ticker":
+                continue
+            alias = row[1].strip()
+            aliases[alias] = row[0].strip()
+            if len(row) > 2 and row[2].strip() == "1":
+                ambiguous.add(alias)
+    return aliases, ambiguous
+
+
+_matcher = None
+_lock = threading.Lock()
+
+
+def default_matcher(builtin=None):
+    """进程内共享的匹配器：内置别名 + 符号文件（文件中的同名别名优先）"""
+    global _matcher
+    with _lock:
+        if _matcher is None:
+            aliases = dict(builtin or {})
+            file_aliases, file_ambiguous = load_aliases()
+            aliases.update(file_aliases)
+            _matcher = TickerMatcher(aliases, AMBIGUOUS_ALIASES | file_ambiguous)
+        return _matcher